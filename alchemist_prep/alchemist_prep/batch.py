@@ -0,0 +1,101 @@
+"""Prepare many alchemist exports in one call.
+
+Run from Designer's Python editor or a farm script::
+
+    from alchemist_prep import batch
+    from plugin_common.packages import user_package_graphs
+
+    results = batch.run_batch(user_package_graphs())
+    print(batch.summarize(results))
+
+Broken exports are found by ``validate`` and skipped before any edit. A
+graph that fails later is rolled back to its exported state. Either way
+the error is recorded and the run moves on to the next graph. Library
+graphs used by the replace rules are resolved once for the whole batch.
+"""
+from collections import namedtuple
+import time
+
+import sd
+
+from plugin_common import graphdiff, scale
+
+from . import prep_graph, replace, rules, tiling
+from .validate import InvalidGraphError
+
+
+INVALID = 'Invalid export'
+
+# diff is the graphdiff report of the run, None without report_path,
+# replace the graph's replace.ReplaceStats, None if it failed
+PrepResult = namedtuple(
+    'PrepResult', ['graph', 'seconds', 'error', 'diff', 'replace']
+)
+
+
+def run_batch(graphs, rule_set=None, scale_table=None, report_path=None,
+              displacement_budget=None, tile_planner=None):
+    """Prepare every graph, returns one PrepResult per graph
+
+    displacement_budget and tile_planner are passed on to ``prep_graph``.
+    With report_path every graph is snapshotted before and after and the
+    diffs are written there as JSON, see ``graphdiff``.
+    """
+    sd_application = sd.getContext().getSDApplication()
+    # Parse the rule file, scale manifest and tiling table once for the
+    # whole run
+    rule_set = rule_set or rules.load_rules()
+    scale_table = scale_table or scale.default_table()
+    resources = replace.LibraryResources(
+        sd_application, sd_application.getPackageMgr()
+    )
+    tile_planner = tile_planner or tiling.default_planner()
+
+    results = []
+    for graph in graphs:
+        before = graphdiff.snapshot(graph) if report_path else None
+        start = time.perf_counter()
+        replace_stats = None
+        try:
+            replace_stats = prep_graph(
+                graph, sd_application, rule_set, scale_table,
+                displacement_budget, resources=resources,
+                tile_planner=tile_planner
+            )
+            error = None
+        except InvalidGraphError as e:
+            # Rejected before any edit, nothing to roll back
+            error = f"{INVALID}: {e}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+
+        graph_diff = None
+        if before is not None:
+            graph_diff = graphdiff.diff(before, graphdiff.snapshot(graph))
+            graph_diff['error'] = error
+        results.append(
+            PrepResult(graph, seconds, error, graph_diff, replace_stats)
+        )
+
+    if report_path:
+        graphdiff.write_report([r.diff for r in results], report_path)
+    return results
+
+
+def summarize(results):
+    """Counts and timings of a batch run"""
+    seconds = sum(r.seconds for r in results)
+    failed = [r for r in results if r.error]
+    return {
+        'graphs': len(results),
+        'succeeded': len(results) - len(failed),
+        'failed': len(failed),
+        'invalid': sum(1 for r in failed if r.error.startswith(INVALID)),
+        'seconds': round(seconds, 3),
+        'replaced': sum(r.replace.replaced for r in results if r.replace),
+        'api_calls_saved': sum(
+            r.replace.calls_saved for r in results if r.replace
+        ),
+        'errors': {r.graph.getIdentifier(): r.error for r in failed},
+    }
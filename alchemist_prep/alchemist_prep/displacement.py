@@ -0,0 +1,72 @@
+"""Quality tier of the normal_to_height node, picked per graph.
+
+normal_to_height is the most expensive node of a prepared graph, cooking
+it at High quality for a 1K preview wastes most of that time. Each tier
+sets the node's ``sample_quality`` and starts at an output size::
+
+    Tier('normal', 0, 0)        # any size
+    Tier('high', 1, 2048)       # 2K and up
+
+``select_tier`` takes the highest tier the output size reaches, then
+steps down while the estimated cook time is over the budget. Estimates
+are milliseconds per megapixel, ``benchmarks/normal_to_height.py``
+measures them and writes ``n2h_costs.json``, which is read from
+``ALCHEMIST_PREP_N2H_COSTS`` or next to this module. The budget comes
+from ``ALCHEMIST_PREP_N2H_BUDGET_MS``, no budget means no step down.
+"""
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+
+Tier = namedtuple('Tier', ['name', 'sample_quality', 'min_size'])
+
+# Lowest to highest quality
+TIERS = (
+    Tier('normal', 0, 0),
+    Tier('high', 1, 2048),
+)
+
+COSTS_FILE = Path(os.environ.get(
+    'ALCHEMIST_PREP_N2H_COSTS',
+    Path(__file__).parent.joinpath('n2h_costs.json')
+))
+BUDGET_ENV = 'ALCHEMIST_PREP_N2H_BUDGET_MS'
+
+
+def load_costs(path=COSTS_FILE):
+    """{tier name: ms per megapixel}, empty if never measured"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def default_budget():
+    budget = os.environ.get(BUDGET_ENV)
+    return float(budget) if budget else None
+
+
+def estimate_ms(tier, size, costs):
+    """Estimated cook time of tier at size (width, height), None if unknown"""
+    per_megapixel = costs.get(tier.name)
+    if per_megapixel is None:
+        return None
+    return per_megapixel * size[0] * size[1] / 1e6
+
+
+def select_tier(size, budget_ms=None, costs=None):
+    """Tier for an output of size (width, height) in pixels"""
+    costs = load_costs() if costs is None else costs
+    index = max(
+        i for i, tier in enumerate(TIERS) if max(size) >= tier.min_size
+    )
+    if budget_ms is not None:
+        while index > 0:
+            estimate = estimate_ms(TIERS[index], size, costs)
+            if estimate is None or estimate <= budget_ms:
+                break
+            index -= 1
+    return TIERS[index]
@@ -0,0 +1,194 @@
+"""The replace rules, planned for a whole graph and applied in one go.
+
+Replacing a node used to look its library graph up and read its
+connections node by node, while editing the graph around it. The work is
+split in two now:
+
+1. ``plan`` reads every node to replace, its input, the nodes it feeds
+   and the input's color mode, before anything is deleted
+2. ``apply`` deletes the planned nodes, then creates and wires their
+   replacements, taking the library graphs from a ``LibraryResources``
+
+One ``LibraryResources`` can serve a whole batch, each library package is
+then loaded once per run instead of once per graph and its graph found
+once instead of once per node. ``ReplaceStats`` counts the Designer API
+calls saved per graph compared with the per node version.
+"""
+from collections import namedtuple
+from pathlib import Path
+
+from sd.api.sdapplication import SDApplicationPath
+from sd.api.sdproperty import SDPropertyCategory
+
+from plugin_common.values import sd_value
+
+from . import rules
+
+
+# Per node version: the package was loaded once per graph, but its
+# resource looked up again for every node, and the input connection
+# read twice, getPropertyFromId and getPropertyConnections once more
+RESOLVE_CALLS = 1
+REPEATED_READS = 2
+
+# One side of a connection, identifiers are read before nodes get deleted
+Endpoint = namedtuple('Endpoint', ['node', 'prop_id', 'identifier'])
+
+# source is the Endpoint feeding the replaced node or None, targets the
+# Endpoints it feeds, grayscale whether the source needs an adapter in
+# front of the replacement
+Replacement = namedtuple(
+    'Replacement',
+    ['identifier', 'node', 'position', 'rule', 'source', 'targets',
+     'grayscale']
+)
+
+ReplaceStats = namedtuple(
+    'ReplaceStats', ['replaced', 'resolved', 'calls_saved']
+)
+
+
+def library_graph(application, package_manager, name):
+    """Graph name from the package of the same name in Designer's library"""
+    resource_path = application.getPath(
+        SDApplicationPath.DefaultResourcesDir
+    )
+    package = package_manager.loadUserPackage(
+        Path(resource_path).joinpath('packages', f'{name}.sbs').as_posix()
+    )
+    return package.findResourceFromUrl(name)
+
+
+class LibraryResources(object):
+    """Library graphs resolved once and handed out again"""
+
+    def __init__(self, application, package_manager):
+        self.application = application
+        self.package_manager = package_manager
+        self._resources = {}
+        self.resolved = 0
+
+    def get(self, name):
+        if name not in self._resources:
+            self._resources[name] = library_graph(
+                self.application, self.package_manager, name
+            )
+            self.resolved += 1
+        return self._resources[name]
+
+
+def _is_grayscale(node):
+    color_mode = node.getPropertyValueFromId(
+        'colorswitch', SDPropertyCategory.Input
+    )
+    return bool(color_mode) and not color_mode.get()
+
+
+def _endpoint(node, prop):
+    return Endpoint(node, prop.getId(), node.getIdentifier())
+
+
+def source_of(node, options):
+    """(node, output property) feeding node, (None, None) if unconnected
+
+    Reads the rule's ``source`` input if it names one, else the first
+    connected input.
+    """
+    if 'source' in options:
+        return rules.upstream_of(node, options['source'])
+    return rules.first_upstream(node)
+
+
+def plan(matches, skip=()):
+    """Replacement of every replace match, read before any edit
+
+    Matches whose identifier is in skip are left out.
+    """
+    planned = []
+    for node, identifier, rule in matches[rules.REPLACE]:
+        if identifier in skip:
+            continue
+        options = rule.options
+        source_node, source_prop = source_of(node, options)
+
+        source = None
+        grayscale = False
+        if source_node is not None:
+            source = _endpoint(source_node, source_prop)
+            if options.get('grayscale_adapter'):
+                grayscale = _is_grayscale(source_node)
+
+        planned.append(Replacement(
+            identifier,
+            node,
+            node.getPosition(),
+            rule,
+            source,
+            [
+                _endpoint(target, target_prop) for target, target_prop
+                in rules.downstream(node, 'unique_filter_output')
+            ],
+            grayscale
+        ))
+    return planned
+
+
+def apply(journal, replacements, resources, tile=None):
+    """Replace the planned nodes, returns ``ReplaceStats``
+
+    resources is a ``LibraryResources``, its graphs may already have been
+    resolved for an earlier graph of the batch. tile is set on the
+    ``tile_parameter`` of rules naming one, see ``tiling``. Replaced nodes
+    feeding each other are wired to each other's replacement.
+    """
+    resolved = resources.resolved
+    for replacement in replacements:
+        journal.delete_node(replacement.node)
+
+    created = {}
+    for replacement in replacements:
+        options = replacement.rule.options
+        new_node = journal.new_instance_node(
+            resources.get(options['resource'])
+        )
+        new_node.setPosition(replacement.position)
+        parameters = options.get('parameters', {})
+        if tile is not None and 'tile_parameter' in options:
+            parameters = dict(parameters, **{options['tile_parameter']: tile})
+        for prop_id, value in parameters.items():
+            new_node.setInputPropertyValueFromId(prop_id, sd_value(value))
+        created[replacement.identifier] = (new_node, options['output'])
+
+    for replacement in replacements:
+        options = replacement.rule.options
+        new_node = created[replacement.identifier][0]
+        source = replacement.source
+        if source is not None:
+            source_node, source_prop_id = created.get(
+                source.identifier, source[:2]
+            )
+            if replacement.grayscale:
+                # Insert a gradient map for conversion
+                adapter = journal.new_node(options['grayscale_adapter'])
+                adapter.setPosition(replacement.position)
+                journal.connect(source_node, source_prop_id,
+                                adapter, 'input1')
+                journal.connect(adapter, 'unique_filter_output',
+                                new_node, options['input'])
+            else:
+                journal.connect(source_node, source_prop_id,
+                                new_node, options['input'])
+
+        for target in replacement.targets:
+            # Replaced targets are wired from their own source
+            if target.identifier not in created:
+                journal.connect(new_node, options['output'],
+                                target.node, target.prop_id)
+
+    resolved = resources.resolved - resolved
+    reused = len(replacements) - resolved
+    return ReplaceStats(
+        len(replacements),
+        resolved,
+        reused * RESOLVE_CALLS + len(replacements) * REPEATED_READS
+    )
@@ -0,0 +1,143 @@
+"""Cleanup rules for alchemist exports, read from a JSON file.
+
+Each rule matches nodes by definition label or id and names an action::
+
+    {"match": {"label": "Height"}, "action": "delete_upstream",
+     "depth": 2, "keep_position": "height"}
+    {"match": {"definition": "sbs::compositing::transformation"},
+     "action": "replace", "resource": "safe_transform",
+     "source": "input1", "input": "input", "output": "output",
+     "parameters": {"tile": 4}, "tile_parameter": "tile",
+     "grayscale_adapter": "sbs::compositing::gradient"}
+    {"match": {"label": "Sheen"}, "action": "rename_output",
+     "name": "SHEEN"}
+
+``delete_upstream`` removes the node and depth nodes up its first
+connected input, ``replace`` swaps the node for an instance of a library
+graph fed from its ``source`` input, or the first connected one, with
+``tile_parameter`` set from ``tiling``, ``rename_output`` names an
+output that ``plugin_common.naming`` doesn't know or names otherwise.
+The rules compile into a lookup table, so one walk over the graph
+matches all of them, however many vendors add their own.
+``ALCHEMIST_PREP_RULES`` points to another rule file, the default is
+rules.json next to this module.
+"""
+import json
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from sd.api.sdproperty import SDPropertyCategory
+
+
+RULES_FILE = Path(os.environ.get(
+    'ALCHEMIST_PREP_RULES',
+    Path(__file__).parent.joinpath('rules.json')
+))
+
+DELETE_UPSTREAM = 'delete_upstream'
+REPLACE = 'replace'
+RENAME_OUTPUT = 'rename_output'
+ACTIONS = (DELETE_UPSTREAM, REPLACE, RENAME_OUTPUT)
+
+MATCH_KEYS = ('label', 'definition')
+
+Rule = namedtuple('Rule', ['action', 'options'])
+
+# Identifiers are read while matching, deleted nodes can't be asked later
+Match = namedtuple('Match', ['node', 'identifier', 'rule'])
+
+
+class RuleError(ValueError):
+    pass
+
+
+class RuleSet(object):
+    """Rules indexed by (match key, value) for single pass matching"""
+
+    def __init__(self, rules=()):
+        self._index = {}
+        self.rules = []
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        action = rule.get('action')
+        if action not in ACTIONS:
+            raise RuleError(f"Unknown rule action {action!r}")
+        match = rule.get('match', {})
+        keys = [(key, match[key]) for key in MATCH_KEYS if key in match]
+        if len(keys) != 1:
+            raise RuleError(
+                f"Rule needs exactly one of {MATCH_KEYS} to match: {rule}"
+            )
+
+        options = {k: v for k, v in rule.items()
+                   if k not in ('match', 'action')}
+        compiled = Rule(action, options)
+        self._index.setdefault(keys[0], []).append(compiled)
+        self.rules.append(compiled)
+
+    def rules_for(self, node):
+        definition = node.getDefinition()
+        return self._index.get(('label', definition.getLabel()), []) + \
+            self._index.get(('definition', definition.getId()), [])
+
+    def match(self, nodes):
+        """Walk nodes once, return {action: [Match, ...]}"""
+        matches = {action: [] for action in ACTIONS}
+        if not self._index:
+            return matches
+        for node in nodes:
+            for rule in self.rules_for(node):
+                matches[rule.action].append(
+                    Match(node, node.getIdentifier(), rule)
+                )
+        return matches
+
+
+def load_rules(path=RULES_FILE):
+    with open(path) as f:
+        return RuleSet(json.load(f)['rules'])
+
+
+def first_upstream(node):
+    """(node, output property) feeding the first connected input"""
+    for prop in node.getProperties(SDPropertyCategory.Input):
+        connections = node.getPropertyConnections(prop)
+        if connections:
+            return connections[0].getInputPropertyNode(), \
+                connections[0].getInputProperty()
+    return None, None
+
+
+def upstream_of(node, prop_id):
+    """(node, output property) feeding the input prop_id"""
+    connections = node.getPropertyConnections(
+        node.getPropertyFromId(prop_id, SDPropertyCategory.Input)
+    )
+    if connections:
+        return connections[0].getInputPropertyNode(), \
+            connections[0].getInputProperty()
+    return None, None
+
+
+def upstream_chain(node, depth):
+    """Up to depth nodes found by following the first connected input"""
+    chain = []
+    for _ in range(depth):
+        node, _ = first_upstream(node)
+        if node is None:
+            break
+        chain.append(node)
+    return chain
+
+
+def downstream(node, prop_id):
+    """(node, input property) pairs connected to the output prop_id"""
+    return [
+        (connection.getInputPropertyNode(), connection.getInputProperty())
+        for connection in node.getPropertyConnections(
+            node.getPropertyFromId(prop_id, SDPropertyCategory.Output)
+        )
+    ]
@@ -0,0 +1,94 @@
+"""Tile count of the safe_transform nodes, from the material's size.
+
+Every safe_transform used to tile 4 times, right for a 17 cm scan on a
+70 cm repeat and wrong for everything else. The tile count is now the
+target repeat of the material's fabric category over its physical size,
+from ``scale.resolve``::
+
+    tile = round(repeat_cm / physical_size_cm)
+
+``tiling.json`` holds the repeat per category and a default. A material
+takes the category listed for it under ``materials``, else the first
+category its package name contains, e.g. ``denim`` for
+``blue_denim_04.sbs``. ``ALCHEMIST_PREP_TILING`` points to another
+table. Replace rules opt in by naming the parameter to set::
+
+    {"match": {"label": "Transformation 2D"}, "action": "replace",
+     "resource": "safe_transform", "tile_parameter": "tile", ...}
+"""
+import json
+import os
+from pathlib import Path
+
+
+TILING_FILE = Path(os.environ.get(
+    'ALCHEMIST_PREP_TILING',
+    Path(__file__).parent.joinpath('tiling.json')
+))
+DEFAULT_REPEAT_CM = 70
+MIN_TILE = 1
+MAX_TILE = 16
+
+
+class TilePlanner(object):
+    """Repeat sizes by category, one planner serves a whole batch"""
+
+    def __init__(self, categories=None, materials=None,
+                 default_repeat_cm=DEFAULT_REPEAT_CM):
+        self.categories = {
+            name.lower(): float(cm) for name, cm in (categories or {}).items()
+        }
+        self.materials = {
+            name.lower(): category.lower()
+            for name, category in (materials or {}).items()
+        }
+        self.default_repeat_cm = float(default_repeat_cm)
+        # Package name -> category, the name scan runs once per material
+        self._categories = {}
+
+    @classmethod
+    def from_file(cls, path=TILING_FILE):
+        with open(path) as f:
+            table = json.load(f)
+        return cls(
+            table.get('categories'),
+            table.get('materials'),
+            table.get('default_repeat_cm', DEFAULT_REPEAT_CM)
+        )
+
+    def category(self, package_path):
+        """Fabric category of the material saved at package_path or None"""
+        name = Path(package_path).stem.lower()
+        if name not in self._categories:
+            category = self.materials.get(name)
+            if category is None:
+                category = next(
+                    (c for c in self.categories if c in name), None
+                )
+            self._categories[name] = category
+        return self._categories[name]
+
+    def repeat_cm(self, package_path):
+        return self.categories.get(
+            self.category(package_path), self.default_repeat_cm
+        )
+
+    def tile_count(self, scale_result, package_path):
+        """Tile count for a ``scale.ScaleResult``, None without one"""
+        if scale_result is None:
+            return None
+        width, height = scale_result.physical_size
+        tile = round(self.repeat_cm(package_path) / ((width + height) / 2))
+        return min(max(tile, MIN_TILE), MAX_TILE)
+
+
+_planners = {}
+
+
+def default_planner():
+    """Planner of TILING_FILE, read again when the file changes"""
+    key = (TILING_FILE, os.stat(TILING_FILE).st_mtime)
+    if key not in _planners:
+        _planners.clear()
+        _planners[key] = TilePlanner.from_file()
+    return _planners[key]
@@ -0,0 +1,70 @@
+"""Read-only checks run before alchemist_prep edits a graph.
+
+Exports missing a map used to fail halfway through the stages, on an
+empty connection list or a missing Normal output. ``validate`` walks the
+graph once, checks everything the stages rely on and returns every
+problem found, so a broken export is rejected before anything changed.
+"""
+from sd.api.sdproperty import SDPropertyCategory
+
+from . import rules
+from .replace import source_of
+
+
+class InvalidGraphError(ValueError):
+    def __init__(self, problems):
+        super(InvalidGraphError, self).__init__('; '.join(problems))
+        self.problems = problems
+
+
+def _connected(node, prop_id, category):
+    prop = node.getPropertyFromId(prop_id, category)
+    return prop is not None and bool(node.getPropertyConnections(prop))
+
+
+def validate(comp_graph, matches):
+    """Problems that would make the stages fail, empty if none
+
+    matches comes from ``RuleSet.match`` on the same graph.
+    """
+    problems = []
+    bitmaps = sum(
+        1 for node in comp_graph.getNodes()
+        if node.getDefinition().getLabel() == 'Bitmap'
+    )
+    # Output nodes only, the atomic Normal filter has the same label
+    normal_outputs = [
+        node for node in comp_graph.getOutputNodes()
+        if node.getDefinition().getLabel() == 'Normal'
+    ]
+
+    if not bitmaps:
+        problems.append("No Bitmap to take the output size from")
+
+    # displacement_setup hooks into the node feeding the Normal output
+    if len(normal_outputs) != 1:
+        problems.append(
+            f"Expected 1 Normal output, found {len(normal_outputs)}"
+        )
+    elif not _connected(normal_outputs[0], 'inputNodeOutput',
+                        SDPropertyCategory.Input):
+        problems.append("Normal output is not connected")
+
+    for node, identifier, rule in matches[rules.DELETE_UPSTREAM]:
+        depth = rule.options.get('depth', 0)
+        found = len(rules.upstream_chain(node, depth))
+        if found < depth:
+            problems.append(
+                f"{node.getDefinition().getLabel()} ({identifier}) has "
+                f"{found} of {depth} upstream nodes to delete"
+            )
+
+    for node, identifier, rule in matches[rules.REPLACE]:
+        label = node.getDefinition().getLabel()
+        if source_of(node, rule.options)[0] is None:
+            problems.append(f"{label} ({identifier}) has no input")
+        if not _connected(node, 'unique_filter_output',
+                          SDPropertyCategory.Output):
+            problems.append(f"{label} ({identifier}) has no output")
+
+    return problems
@@ -0,0 +1 @@
+"""Timing scripts, run from Designer's Python editor or the command line."""
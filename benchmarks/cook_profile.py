@@ -0,0 +1,227 @@
+"""Cook time and memory per node type of prepared materials.
+
+Run from Designer's Python editor on freshly loaded packages, after
+alchemist_prep or color_mixer::
+
+    from benchmarks import cook_profile
+    profiles = cook_profile.run(report_path='cook_profile.json')
+
+    # After a plugin change, flag materials that got slower
+    cook_profile.run(report_path='after.json',
+                     baseline_path='cook_profile.json', threshold=0.25)
+
+The outputs of each graph are disconnected and a single probe output is
+wired to one node after the other, upstream nodes first. Designer only
+cooks what the outputs need and keeps what it cooked, so every
+``compute()`` cooks exactly the probed node: its time and the change of
+process memory are that node's cost. The outputs are reconnected and the
+probe deleted afterwards, no existing node is deleted or recreated.
+
+The JSON report keeps every node, the CSV next to it sums them per node
+type: the definition of atomic nodes, the graph of instances such as
+color_match, safe_transform or normal_to_height_hq. Memory needs
+psutil and is left empty without it.
+"""
+import csv
+import json
+from collections import namedtuple
+from pathlib import Path
+import time
+
+from sd.api.sdproperty import SDPropertyCategory
+
+from plugin_common import graphdiff
+from plugin_common.journal import ATOMIC_PREFIX, GraphJournal
+from plugin_common.packages import user_package_graphs
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+OUTPUT_ID = 'sbs::compositing::output'
+DEFAULT_THRESHOLD = 0.25
+
+NodeCost = namedtuple(
+    'NodeCost', ['identifier', 'node_type', 'ms', 'memory_mb']
+)
+GraphProfile = namedtuple('GraphProfile', ['graph', 'total_ms', 'nodes'])
+
+
+def _memory_mb():
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / 2 ** 20
+
+
+def node_type(node):
+    """Definition id of atomic nodes, graph identifier of instances"""
+    definition_id = node.getDefinition().getId()
+    if definition_id.startswith(ATOMIC_PREFIX):
+        return definition_id
+    resource = node.getReferencedResource()
+    return resource.getIdentifier() if resource else definition_id
+
+
+def cook_order(snapshot):
+    """Node identifiers of a ``graphdiff`` snapshot, upstream first"""
+    upstream = {identifier: set() for identifier in snapshot.nodes}
+    downstream = {identifier: set() for identifier in snapshot.nodes}
+    for source, _, target, _ in snapshot.connections:
+        upstream[target].add(source)
+        downstream[source].add(target)
+
+    ready = sorted(i for i, sources in upstream.items() if not sources)
+    order = []
+    while ready:
+        identifier = ready.pop()
+        order.append(identifier)
+        for target in downstream[identifier]:
+            upstream[target].discard(identifier)
+            if not upstream[target]:
+                ready.append(target)
+    return order
+
+
+def _output_id(node, snapshot, identifier):
+    """Output property to probe, the one the graph already uses if any"""
+    for source, prop_id, _, _ in snapshot.connections:
+        if source == identifier:
+            return prop_id
+    outputs = node.getProperties(SDPropertyCategory.Output)
+    return outputs[0].getId() if outputs else None
+
+
+def profile_graph(graph):
+    """``GraphProfile`` of graph, which is left as it was"""
+    snapshot = graphdiff.snapshot(graph)
+    nodes = {node.getIdentifier(): node for node in graph.getNodes()}
+    outputs = {identifier for identifier, node in nodes.items()
+               if node.getDefinition().getId() == OUTPUT_ID}
+
+    costs = []
+    journal = GraphJournal(graph)
+    try:
+        for identifier in outputs:
+            journal.disconnect(nodes[identifier], 'inputNodeOutput')
+        probe = journal.new_node(OUTPUT_ID)
+
+        for identifier in cook_order(snapshot):
+            if identifier in outputs:
+                continue
+            node = nodes[identifier]
+            prop_id = _output_id(node, snapshot, identifier)
+            if prop_id is None:
+                continue
+            journal.connect(node, prop_id, probe, 'inputNodeOutput')
+
+            memory = _memory_mb()
+            start = time.perf_counter()
+            graph.compute()
+            ms = (time.perf_counter() - start) * 1000
+            if memory is not None:
+                memory = _memory_mb() - memory
+            costs.append(NodeCost(identifier, node_type(node), ms, memory))
+    finally:
+        journal.rollback()
+
+    return GraphProfile(
+        graph.getIdentifier(), sum(cost.ms for cost in costs), costs
+    )
+
+
+def by_node_type(profiles):
+    """{node type: {count, total_ms, max_ms, memory_mb}} over profiles"""
+    types = {}
+    for profile in profiles:
+        for cost in profile.nodes:
+            entry = types.setdefault(cost.node_type, {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'memory_mb': None,
+            })
+            entry['count'] += 1
+            entry['total_ms'] += cost.ms
+            entry['max_ms'] = max(entry['max_ms'], cost.ms)
+            if cost.memory_mb is not None:
+                entry['memory_mb'] = (entry['memory_mb'] or 0) + \
+                    cost.memory_mb
+    return dict(
+        sorted(types.items(), key=lambda item: -item[1]['total_ms'])
+    )
+
+
+def write_report(profiles, path):
+    """JSON of every node at path, CSV per node type next to it"""
+    path = Path(path)
+    with open(path, 'w') as f:
+        json.dump({
+            profile.graph: {
+                'total_ms': round(profile.total_ms, 2),
+                'nodes': [cost._asdict() for cost in profile.nodes],
+            }
+            for profile in profiles
+        }, f, indent=1)
+
+    with open(path.with_suffix('.csv'), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ['node_type', 'count', 'total_ms', 'mean_ms', 'max_ms',
+             'memory_mb']
+        )
+        for name, entry in by_node_type(profiles).items():
+            memory = entry['memory_mb']
+            writer.writerow([
+                name,
+                entry['count'],
+                round(entry['total_ms'], 2),
+                round(entry['total_ms'] / entry['count'], 2),
+                round(entry['max_ms'], 2),
+                '' if memory is None else round(memory, 1),
+            ])
+
+
+def load_baseline(path):
+    """{graph: total ms} of an earlier JSON report"""
+    with open(path) as f:
+        report = json.load(f)
+    return {graph: entry['total_ms'] for graph, entry in report.items()}
+
+
+def regressions(profiles, baseline, threshold=DEFAULT_THRESHOLD):
+    """(graph, baseline ms, ms) of graphs over threshold slower, worst first
+
+    threshold is relative, 0.25 flags graphs cooking 25% longer.
+    """
+    slower = [
+        (profile.graph, baseline[profile.graph], profile.total_ms)
+        for profile in profiles
+        if profile.graph in baseline and
+        profile.total_ms > baseline[profile.graph] * (1 + threshold)
+    ]
+    return sorted(slower, key=lambda entry: entry[1] / entry[2])
+
+
+def run(graphs=None, report_path='cook_profile.json', baseline_path=None,
+        threshold=DEFAULT_THRESHOLD):
+    """Profile graphs, all graphs of the user packages by default
+
+    Writes the report, prints the slowest node types and, with a
+    baseline report, the regressions. Returns the profiles.
+    """
+    graphs = user_package_graphs() if graphs is None else graphs
+    profiles = [profile_graph(graph) for graph in graphs]
+    write_report(profiles, report_path)
+
+    for name, entry in list(by_node_type(profiles).items())[:10]:
+        print(f"{name:>40}: {entry['total_ms']:9.1f} ms over "
+              f"{entry['count']} nodes")
+
+    if baseline_path:
+        slower = regressions(profiles, load_baseline(baseline_path),
+                             threshold)
+        for graph, before, after in slower:
+            print(f"SLOWER {graph}: {before:.1f} -> {after:.1f} ms")
+        print(f"{len(slower)} of {len(profiles)} graphs over "
+              f"{threshold:.0%} slower")
+    return profiles
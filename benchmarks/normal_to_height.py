@@ -0,0 +1,131 @@
+"""Cook time and height error of the normal_to_height quality tiers.
+
+Run from Designer's Python editor with alchemist_prep installed::
+
+    from benchmarks import normal_to_height
+    normal_to_height.run(['fabric_a-NRM.png', 'fabric_b-NRM.png'])
+
+Every normal map is wired into the bundled normal_to_height_hq graph and
+cooked once per tier. The height error is the RMS difference to the
+highest tier, in 0-1 height units. The measured ms per megapixel are
+saved to ``n2h_costs.json`` for ``displacement.select_tier``.
+"""
+import json
+import os
+from pathlib import Path
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import sd
+from sd.api.sbs.sdsbscompgraph import SDSBSCompGraph
+from sd.api.sdproperty import SDPropertyCategory
+from sd.api.sdresource import EmbedMethod
+from sd.api.sdresourcebitmap import SDResourceBitmap
+
+from PySide2.QtGui import QImage
+
+from alchemist_prep import displacement
+from plugin_common.values import sd_bool, sd_float, sd_int
+
+
+def _height_array(node):
+    """Cooked height output as a float array in 0-1"""
+    prop = node.getPropertyFromId('height', SDPropertyCategory.Output)
+    handle, path = tempfile.mkstemp(suffix='.png')
+    os.close(handle)
+    try:
+        node.getPropertyValue(prop).get().save(path)
+        image = QImage(path).convertToFormat(QImage.Format_Grayscale8)
+    finally:
+        os.remove(path)
+
+    width, height = image.width(), image.height()
+    # No setsize(), PySide2's constBits() is a plain buffer
+    buffer = np.frombuffer(image.constBits(), dtype=np.uint8,
+                           count=image.bytesPerLine() * height)
+    rows = buffer.reshape(height, image.bytesPerLine())
+    return rows[:, :width].astype(np.float32) / 255
+
+
+def _time_tier(graph, n2h_node, tier, repeat):
+    n2h_node.setInputPropertyValueFromId(
+        'sample_quality', sd_int(tier.sample_quality)
+    )
+    times = []
+    for _ in range(repeat):
+        # Touch the node so every repeat cooks it again
+        n2h_node.setInputPropertyValueFromId(
+            'relief_balance', sd_float(1 - len(times) * 1e-4)
+        )
+        start = time.perf_counter()
+        graph.compute()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # Back to the plugin's setting before the result is read
+    n2h_node.setInputPropertyValueFromId('relief_balance', sd_float(1))
+    graph.compute()
+    return min(times)
+
+
+def run(normal_paths, repeat=3, costs_path=displacement.COSTS_FILE):
+    """Print and return {map: {tier: (ms, rms error)}}, save the costs"""
+    sd_application = sd.getContext().getSDApplication()
+    package_manager = sd_application.getPackageMgr()
+    package = package_manager.newUserPackage()
+    n2h_package = package_manager.loadUserPackage(
+        Path(displacement.__file__).parent.joinpath(
+            'normal_to_height_hq_cust.sbs').as_posix()
+    )
+    n2h_resource = n2h_package.findResourceFromUrl('normal_to_height_hq')
+
+    results = {}
+    per_megapixel = {tier.name: [] for tier in displacement.TIERS}
+    try:
+        for path in normal_paths:
+            graph = SDSBSCompGraph.sNew(package)
+            bitmap = graph.newInstanceNode(SDResourceBitmap.sNewFromFile(
+                package, Path(path).as_posix(), EmbedMethod.Linked
+            ))
+            n2h_node = graph.newInstanceNode(n2h_resource)
+            bitmap.newPropertyConnectionFromId(
+                'unique_filter_output', n2h_node, 'normal'
+            )
+            n2h_node.setInputPropertyValueFromId(
+                'height_normalize', sd_bool(True)
+            )
+            # Warm up, cooks the bitmap once
+            graph.compute()
+
+            heights = {}
+            timings = {}
+            for tier in displacement.TIERS:
+                timings[tier.name] = _time_tier(graph, n2h_node, tier, repeat)
+                heights[tier.name] = _height_array(n2h_node)
+
+            reference = heights[displacement.TIERS[-1].name]
+            megapixels = reference.size / 1e6
+            results[path] = {}
+            for tier in displacement.TIERS:
+                error = float(np.sqrt(np.mean(
+                    (heights[tier.name] - reference) ** 2
+                )))
+                results[path][tier.name] = (timings[tier.name], error)
+                per_megapixel[tier.name].append(
+                    timings[tier.name] / megapixels
+                )
+                print(f"{Path(path).name} {tier.name:>8}: "
+                      f"{timings[tier.name]:9.1f} ms, rms error {error:.4f}")
+    finally:
+        package_manager.unloadUserPackage(package)
+
+    costs = {
+        name: round(statistics.median(values), 2)
+        for name, values in per_megapixel.items() if values
+    }
+    with open(costs_path, 'w') as f:
+        json.dump(costs, f, indent=4)
+    print(f"ms per megapixel {costs}, saved to {costs_path}")
+    return results
@@ -0,0 +1,59 @@
+"""Time a 200 color spread with and without the interned value cache.
+
+Run from Designer's Python editor with color_mixer installed::
+
+    from benchmarks import value_cache
+    value_cache.run()
+
+Each pass builds the spread into a fresh graph of a throwaway package,
+the graph is not cooked so only node creation and property setting count.
+"""
+import time
+
+import sd
+from sd.api.sbs.sdsbscompgraph import SDSBSCompGraph
+
+from plugin_common import values
+from color_mixer_plugin.spread import build_spread, load_color_match, \
+    spread_colors
+
+
+def _spread_pass(package, color_match, sd_colors):
+    graph = SDSBSCompGraph.sNew(package)
+    source = graph.newNode('sbs::compositing::uniform')
+
+    values.clear()
+    start = time.perf_counter()
+    build_spread(graph, source, sd_colors, color_match)
+    return time.perf_counter() - start, values.stats()
+
+
+def run(count=200, repeat=3):
+    """Print timings and allocation counts, cached vs uncached"""
+    sd_application = sd.getContext().getSDApplication()
+    package = sd_application.getPackageMgr().newUserPackage()
+    color_match = load_color_match(sd_application)
+    sd_colors = spread_colors(count)
+
+    results = {}
+    try:
+        for enabled in (False, True):
+            values.enabled = enabled
+            passes = [_spread_pass(package, color_match, sd_colors)
+                      for _ in range(repeat)]
+            results[enabled] = min(seconds for seconds, _ in passes), \
+                passes[-1][1]
+    finally:
+        values.enabled = True
+        sd_application.getPackageMgr().unloadUserPackage(package)
+
+    for enabled, (seconds, stats) in results.items():
+        allocated = sum(kind['allocated'] for kind in stats.values())
+        saved = sum(kind['saved'] for kind in stats.values())
+        print(f"cache {'on ' if enabled else 'off'}: {seconds:.3f}s, "
+              f"{allocated} values allocated, {saved} reused")
+    return results
+
+
+if __name__ == '__main__':
+    run()
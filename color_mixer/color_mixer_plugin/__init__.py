@@ -1,28 +1,22 @@
-from functools import partial
-import weakref
-from pathlib import Path
-from colorsys import hsv_to_rgb
-
 import sd
-from sd.api import SDValueBool
-from sd.api.sdvaluestring import SDValueString
 from sd.api.sbs.sdsbscompgraph import SDSBSCompGraph
-from sd.api.sdapplication import SDApplicationPath
-from sd.api.sdvalueint import SDValueInt
-from sd.api.sdvaluefloat import SDValueFloat
-from sd.api.sdbasetypes import float2
 from sd.api.sdvaluecolorrgba import SDValueColorRGBA
-from sd.api.sdvaluearray import SDValueArray
-from sd.api.sdvaluestruct import SDValueStruct
-from sd.api.sdtypestruct import SDTypeStruct
 from sd.api.sdbasetypes import ColorRGBA
 
-from PySide2 import QtGui, QtWidgets
-from PySide2.QtCore import Qt
+from PySide2.QtCore import Qt, QSize
 from PySide2.QtGui import QPixmap, QIcon, QColor
 from PySide2.QtWidgets import QDialog, QVBoxLayout, QCheckBox, QPushButton, \
     QHBoxLayout, QLabel, QComboBox, QFrame, QListWidget, QListWidgetItem, \
-    QLineEdit, QAction, QColorDialog, QErrorMessage, QMessageBox, QInputDialog
+    QLineEdit, QAction, QColorDialog, QErrorMessage, QMessageBox, \
+    QInputDialog, QFileDialog
+
+from plugin_common import icons, runtime
+
+from . import presets, preview
+from .atlas import export_atlas
+from .spread import SPREAD_MODES, SPREAD_COMPACT, SPREAD_ATLAS, \
+    SPREAD_GRADIENT, load_color_match, mix_colors_multi, spread_colors
+from .variants import export_variants
 
 
 PANTONE_COLOR_BOOKS = [
@@ -45,6 +39,11 @@ PANTONE_COLOR_BOOKS = [
     "PANTONE+ Solid Uncoated",
 ]
 
+NO_PRESET = "(No preset)"
+
+# List item role holding the book of a spot color
+BOOK_ROLE = Qt.UserRole + 1
+
 
 class ColorModeDialog(QDialog):
     def __init__(self, parent=None):
@@ -52,6 +51,22 @@ class ColorModeDialog(QDialog):
 
         self.setWindowTitle("Options")
 
+        # Preset selection and saving
+        preset_layout = QHBoxLayout()
+        preset_label = QLabel("Preset: ")
+        self.preset_dropdown = QComboBox()
+        self.preset_dropdown.addItem(NO_PRESET)
+        self.preset_dropdown.addItems(presets.store.names())
+        preset_layout.addWidget(preset_label)
+        preset_layout.addWidget(self.preset_dropdown)
+
+        save_layout = QHBoxLayout()
+        self.save_preset_check = QCheckBox("Save as preset: ")
+        self.preset_name_line = QLineEdit()
+        self.preset_name_line.setPlaceholderText("SS25 Knits")
+        save_layout.addWidget(self.save_preset_check)
+        save_layout.addWidget(self.preset_name_line)
+
         self.pantone_check = QCheckBox("Pantone colors only")
         self.custom_check = QCheckBox("Custom color selection")
         color_mode_button = QPushButton("Accept")
@@ -69,10 +84,24 @@ class ColorModeDialog(QDialog):
         dropdown_layout.addWidget(self.book_dropdown)
         dropdown_frame.setLayout(dropdown_layout)
 
+        # Spread mode selection
+        mode_layout = QHBoxLayout()
+        mode_label = QLabel("Spread Mode: ")
+        self.mode_dropdown = QComboBox()
+        self.mode_dropdown.addItems(SPREAD_MODES)
+
+        mode_frame = QFrame()
+        mode_layout.addWidget(mode_label)
+        mode_layout.addWidget(self.mode_dropdown)
+        mode_frame.setLayout(mode_layout)
+
         vlayout = QVBoxLayout()
+        vlayout.addLayout(preset_layout)
         vlayout.addWidget(self.pantone_check)
         vlayout.addWidget(dropdown_frame)
         vlayout.addWidget(self.custom_check)
+        vlayout.addWidget(mode_frame)
+        vlayout.addLayout(save_layout)
         vlayout.addWidget(color_mode_button)
         self.setLayout(vlayout)
 
@@ -84,15 +113,40 @@ class ColorModeDialog(QDialog):
             lambda x: dropdown_frame.show() if x else dropdown_frame.hide()
         )
 
+        self.preset_dropdown.currentTextChanged.connect(self.load_preset)
+
         color_mode_button.clicked.connect(self.accept)
 
+    def current_preset(self):
+        return presets.store.get(self.preset_dropdown.currentText())
+
+    def load_preset(self, name):
+        """Set the options from a saved preset"""
+        preset = presets.store.get(name)
+        if not preset:
+            return
+
+        self.pantone_check.setChecked(preset['pantone'])
+        self.custom_check.setChecked(bool(preset['colors']))
+        self.mode_dropdown.setCurrentIndex(preset['mode'])
+        if preset['book'] in PANTONE_COLOR_BOOKS:
+            self.book_dropdown.setCurrentText(preset['book'])
+        self.preset_name_line.setText(name)
+
+    def save_preset_name(self):
+        if self.save_preset_check.isChecked():
+            return self.preset_name_line.text().strip()
+        return ''
+
 
 class CustomSelectionDialog(QDialog):
-    def __init__(self, spotlib, pantone_mode, book_index=0, parent=None):
+    def __init__(self, spotlib, pantone_mode, book_index=0, parent=None,
+                 preview_source=None):
         super(CustomSelectionDialog, self).__init__(parent)
 
         self.setWindowTitle("Custom Color Pick")
         self.spotlib = spotlib
+        self.preview_source = preview_source
 
         # Base window setup
         self.book_dropdown = QComboBox()
@@ -102,6 +156,10 @@ class CustomSelectionDialog(QDialog):
         custom_vlayout = QVBoxLayout()
         custom_accept = QPushButton("Confirm Colors")
         self.color_list = QListWidget()
+        if preview_source:
+            self.color_list.setIconSize(
+                QSize(preview.THUMBNAIL_SIZE, preview.THUMBNAIL_SIZE)
+            )
 
         # Color input Setup
         color_pick_confirm_btn = QPushButton("Pick Color")
@@ -175,20 +233,102 @@ class CustomSelectionDialog(QDialog):
     def add_custom_color(self):
         color_dialog = QColorDialog()
         color = color_dialog.getColor()
-        if color:
-            # Get color from picker, save with a pixmap
-            pixmap = QPixmap(25, 25)
-            pixmap.fill(color)
-            icon = QIcon(pixmap)
-
-            color_list_item = QListWidgetItem(
-                icon,
-                color.name() + f" | R: {color.red()}, "
-                               f"G: {color.green()}, "
-                               f"B: {color.blue()}"
-            )
-            color_list_item.setData(Qt.UserRole, color)
-            self.color_list.addItem(color_list_item)
+        if color.isValid():
+            self.add_qcolor_item(color)
+
+    def add_qcolor_item(self, color):
+        # Get color from picker, save with a pixmap
+        icon = self.color_icon(color)
+
+        color_list_item = QListWidgetItem(
+            icon,
+            color.name() + f" | R: {color.red()}, "
+                           f"G: {color.green()}, "
+                           f"B: {color.blue()}"
+        )
+        color_list_item.setData(Qt.UserRole, color)
+        self.color_list.addItem(color_list_item)
+
+    def add_spot_item(self, col, book):
+        col_rgb = col.get()
+        col_name = self.spotlib.getSpotColorName(col)
+        if self.color_list.findItems(col_name, Qt.MatchFixedString):
+            return
+
+        color = QColor()
+        color.setRgbF(col_rgb.r, col_rgb.g, col_rgb.b,)
+
+        print(f"R: {col_rgb.r*255} G: {col_rgb.g*255} B: {col_rgb.b*255}")
+        icon = self.color_icon(color)
+        color_list_item = QListWidgetItem(icon, col_name)
+        color_list_item.setData(Qt.UserRole, col)
+        color_list_item.setData(BOOK_ROLE, book)
+        self.color_list.addItem(color_list_item)
+
+    def load_colors(self, entries):
+        """Fill the list from preset color entries"""
+        for entry in entries:
+            if entry.get('book'):
+                col = presets.resolve_entry(entry, self.spotlib)
+                if isinstance(col, SDValueColorRGBA):
+                    # Book not available, fall back to the stored color
+                    self.add_qcolor_item(QColor.fromRgbF(*entry['rgb']))
+                else:
+                    self.add_spot_item(col, entry['book'])
+            else:
+                self.add_qcolor_item(QColor.fromRgbF(*entry['rgb']))
+
+    def _items(self):
+        return [self.color_list.item(i) for i in range(self.color_list.count())]
+
+    def sd_colors(self):
+        """SD colors of the list, spot colors are kept as they are"""
+        sd_colors = []
+        for item in self._items():
+            color = item.data(Qt.UserRole)
+
+            # Convert to substance color if coming from QColorPicker
+            # QColor(0-255) -> ColorRGBA(0.0-1.0)
+            if isinstance(color, QColor):
+                color = SDValueColorRGBA.sNew(
+                    ColorRGBA(
+                        color.red()/255,
+                        color.green()/255,
+                        color.blue()/255,
+                        1)
+                )
+            sd_colors.append(color)
+        return sd_colors
+
+    def preset_colors(self):
+        """Preset entries for the colors of the list"""
+        entries = []
+        for item in self._items():
+            color = item.data(Qt.UserRole)
+            if isinstance(color, QColor):
+                entries.append(presets.color_entry(
+                    color.name(),
+                    (color.redF(), color.greenF(), color.blueF())
+                ))
+            else:
+                col_rgb = color.get()
+                entries.append(presets.color_entry(
+                    item.text(),
+                    (col_rgb.r, col_rgb.g, col_rgb.b),
+                    item.data(BOOK_ROLE)
+                ))
+        return entries
+
+    def color_icon(self, color):
+        """Preview of the source recolored to color, or a plain swatch"""
+        if self.preview_source:
+            return QIcon(self.preview_source.thumbnail(
+                (color.redF(), color.greenF(), color.blueF())
+            ))
+
+        pixmap = QPixmap(25, 25)
+        pixmap.fill(color)
+        return QIcon(pixmap)
 
     def find_pantone_color(self):
         """Find the input color, add to list if exist"""
@@ -202,19 +342,7 @@ class CustomSelectionDialog(QDialog):
             spotColorName=color_name
         )
         if col:
-            col_rgb = col.get()
-            col_name = self.spotlib.getSpotColorName(col)
-            if not self.color_list.findItems(col_name, Qt.MatchFixedString):
-                color = QColor()
-                color.setRgbF(col_rgb.r, col_rgb.g, col_rgb.b,)
-
-                print(f"R: {col_rgb.r*255} G: {col_rgb.g*255} B: {col_rgb.b*255}")
-                pixmap = QPixmap(25, 25)
-                pixmap.fill(color)
-                icon = QIcon(pixmap)
-                color_list_item = QListWidgetItem(icon, col_name)
-                color_list_item.setData(Qt.UserRole, col)
-                self.color_list.addItem(color_list_item)
+            self.add_spot_item(col, book)
         else:
             error_message = QErrorMessage()
             error_message.setWindowTitle("Bad Color")
@@ -224,388 +352,143 @@ class CustomSelectionDialog(QDialog):
             )
 
 
-class PluginToolBar(QtWidgets.QToolBar):
-    __toolbarList = {}
-
-    def __init__(self, graphViewID, uiMgr):
-        super(PluginToolBar, self).__init__(parent=uiMgr.getMainWindow())
-
-        self.setObjectName('color_mixer_plugin_toolbar')
-
-        self.__graphViewID = graphViewID
-        self.__uiMgr = uiMgr
-
-        current_dir = Path(__file__).parent
-        icon_path = Path.joinpath(current_dir, r'icons\color_mixer.png')
-
-        action = self.addAction(
-            QtGui.QIcon(icon_path.as_posix()),
-            "color_mixer"
-        )
-        action.setToolTip(
-            "Setup Node structure for color adjustment. The nodes are "
-            "given default values for manual adjustment"
+def color_mixer():
+    sd_context = sd.getContext()
+    sd_application = sd_context.getSDApplication()
+    uimgr = sd_application.getUIMgr()
+    mainWin = sd_application.getQtForPythonUIMgr().getMainWindow()
+    spotLib = sd_application.getSpotColorLibrary()
+
+    # Init error message
+    dialog = QMessageBox()
+    dialog.setWindowTitle("Plugin Error!")
+
+    comp_graph: SDSBSCompGraph = uimgr.getCurrentGraph()
+    if not comp_graph:
+        dialog.setText("Failed to find graph.")
+        dialog.exec_()
+        return
+
+    comp_graph.compute()
+
+    # Every selected node gets recolored, sharing the target colors
+    graph_select = uimgr.getCurrentGraphSelection()
+    col_map_nodes = [
+        graph_select[i] for i in range(graph_select.getSize())
+    ]
+    if not col_map_nodes:
+        dialog.setText("Please select at least 1 Color node!")
+        dialog.exec_()
+        return
+    col_map_node = col_map_nodes[0]
+
+    color_mode_window = ColorModeDialog(parent=mainWin)
+    result = color_mode_window.exec_()
+    if not result:
+        return
+
+    is_pantone = color_mode_window.pantone_check.isChecked()
+    custom_col = color_mode_window.custom_check.isChecked()
+    book_index = color_mode_window.book_dropdown.currentIndex()
+    book = color_mode_window.book_dropdown.currentText()
+    spread_mode = color_mode_window.mode_dropdown.currentIndex()
+    preset = color_mode_window.current_preset()
+
+    # InputDialog to find how many outputs
+    if custom_col:
+        # Window setup, thumbnails need the cooked source map
+        custom_window = CustomSelectionDialog(
+            spotLib,
+            is_pantone,
+            book_index,
+            mainWin,
+            preview.load_source(col_map_node)
         )
-        action.triggered.connect(self.color_mixer)
-
-        self.__toolbarList[graphViewID] = weakref.ref(self)
-        self.destroyed.connect(
-            partial
-            (PluginToolBar.__onToolbarDeleted,
-             graphViewID=graphViewID
-             )
+        if preset:
+            custom_window.load_colors(preset['colors'])
+        result = custom_window.exec_()
+        col_count = custom_window.color_list.count()
+    else:
+        col_count, result = QInputDialog().getInt(
+            mainWin, "Colors Spread", "Number of Colors:",
+            preset['count'] if preset else 6, 0, 200, 1
         )
 
-    def tooltip(self):
-        return self.tr("Custom Plugins")
-
-    def color_mixer(self):
-        sd_context = sd.getContext()
-        sd_application = sd_context.getSDApplication()
-        package_manager = sd_application.getPackageMgr()
-        uimgr = sd_application.getUIMgr()
-        mainWin = sd_application.getQtForPythonUIMgr().getMainWindow()
-        spotLib = sd_application.getSpotColorLibrary()
-
-        # Init error message
-        dialog = QMessageBox()
-        dialog.setWindowTitle("Plugin Error!")
-
-        comp_graph: SDSBSCompGraph = uimgr.getCurrentGraph()
-        if not comp_graph:
-            dialog.setText("Failed to find graph.")
-            dialog.exec_()
-            return
-
-        comp_graph.compute()
-
-        levels_id = 'sbs::compositing::levels'
-        gradient_id = 'sbs::compositing::gradient'
-        uniform_id = 'sbs::compositing::uniform'
-        output_id = 'sbs::compositing::output'
-
-        graph_select = uimgr.getCurrentGraphSelection()
-        if graph_select.getSize() != 1:
-            dialog.setText("Please select only 1 Color node")
-            dialog.exec_()
-            return
-
-        col_map_node = graph_select[0]
-        if not col_map_node:
-            dialog.setText("Please select a node!")
-            dialog.exec_()
-            return
-
-        color_mode_window = ColorModeDialog(parent=mainWin)
-        result = color_mode_window.exec_()
-        if not result:
-            return
-
-        is_pantone = color_mode_window.pantone_check.isChecked()
-        custom_col = color_mode_window.custom_check.isChecked()
-        book_index = color_mode_window.book_dropdown.currentIndex()
-
-        # InputDialog to find how many outputs
-        if custom_col:
-            # Window setup
-            custom_window = CustomSelectionDialog(
-                spotLib,
-                is_pantone,
-                book_index,
-                mainWin
-            )
-            result = custom_window.exec_()
-            col_count = custom_window.color_list.count()
-        else:
-            col_count, result = QInputDialog().getInt(
-                self, "Colors Spread", "Number of Colors:", 6, 0, 200, 1
-            )
-
-        if not result:
-            print("EXITING")
-            return
+    if not result:
+        print("EXITING")
+        return
 
-        # Load instance sbs files
-        resource_path = sd_application.getPath(
-            SDApplicationPath.DefaultResourcesDir
+    # Resolve all target colors before building anything
+    if custom_col:
+        sd_colors = custom_window.sd_colors()
+    else:
+        sd_colors = spread_colors(
+            col_count, spotLib, book if is_pantone else None
         )
 
-        color_match_name = 'color_match'
-        color_match_pack = package_manager.loadUserPackage(
-            Path(resource_path).joinpath(
-                'packages',
-                'color_match.sbs'
-            ).as_posix()
+    preset_name = color_mode_window.save_preset_name()
+    if preset_name:
+        presets.store.save(preset_name, presets.make_preset(
+            spread_mode,
+            is_pantone,
+            book,
+            col_count,
+            custom_window.preset_colors() if custom_col else ()
+        ))
+
+    # Load instance sbs files, gradient spreads load their own chain
+    color_match = None
+    if spread_mode != SPREAD_GRADIENT:
+        color_match = load_color_match(sd_application)
+
+    # Map -> Output node with type label, then every selected spread,
+    # all placed by one layout planner and computed once
+    created = mix_colors_multi(
+        comp_graph,
+        col_map_nodes,
+        sd_colors,
+        spread_mode,
+        map_outputs=True,
+        color_match_resource=color_match
+    )
+
+    if spread_mode == SPREAD_COMPACT and sd_colors:
+        export = QMessageBox.question(
+            mainWin,
+            "Compact Spread",
+            f"Export the {len(sd_colors)} color variants now?"
         )
-
-        # Map -> Output node with type label
-        for node in comp_graph.getNodes():
-            node_label = node.getDefinition().getLabel()
-            if node_label == 'Bitmap' and node != col_map_node:
-                # Connect other maps to output and label
-                file_path = Path(node.getReferencedResource().getFilePath())
-                map_type = file_path.stem.split('-')[-1]
-                map_out = comp_graph.newNode(output_id)
-
-                npos = node.getPosition()
-                new_pos = float2(npos.x+200, npos.y)
-                map_out.setPosition(new_pos)
-
-                node.newPropertyConnectionFromId(
-                    "unique_filter_output", map_out, "inputNodeOutput"
-                )
-                map_out.setAnnotationPropertyValueFromId(
-                    "identifier", SDValueString.sNew(f"{map_type.upper()}")
-                )
-
-        # Currently unused, should check if this would ever be used again
-        advanced_mode = False
-        if advanced_mode:
-            # Load packages
-            gray_conv_name = 'grayscale_conversion_advanced'
-            gray_conv_pack = package_manager.loadUserPackage(
-                Path(resource_path).joinpath(
-                    'packages',
-                    'grayscale_conversion_advanced.sbs'
-                ).as_posix()
-            )
-
-            auto_lvl_name = 'auto_levels'
-            auto_lvl_pack = package_manager.loadUserPackage(
-                Path(resource_path).joinpath(
-                    'packages',
-                    'auto_levels.sbs'
-                ).as_posix()
+        if export == QMessageBox.Yes:
+            directory = QFileDialog.getExistingDirectory(
+                mainWin, "Variant Export Folder"
             )
-
-            gray_conv = comp_graph.newInstanceNode(
-                gray_conv_pack.findResourceFromUrl(gray_conv_name)
-            )
-
-            auto_lvl = comp_graph.newInstanceNode(
-                auto_lvl_pack.findResourceFromUrl(auto_lvl_name)
-            )
-
-            # Get positioning
-            col_pos: float2 = col_map_node.getPosition()
-            gray_pos = float2(col_pos.x+200, col_pos.y)
-            alvl_pos = float2(col_pos.x+400, col_pos.y)
-            lvl_pos = float2(col_pos.x+600, col_pos.y)
-
-            lvl_node = comp_graph.newNode(levels_id)
-
-            # Arranging nodes
-            gray_conv.setPosition(gray_pos)
-            auto_lvl.setPosition(alvl_pos)
-            lvl_node.setPosition(lvl_pos)
-
-            # Creating connections
-            col_map_node.newPropertyConnectionFromId(
-                "unique_filter_output", gray_conv, "input"
-            )
-            gray_conv.newPropertyConnectionFromId(
-                "output", auto_lvl, "Input"
-            )
-            auto_lvl.newPropertyConnectionFromId(
-                "Output", lvl_node, "input1"
-            )
-
-            top_y = col_pos.y - (col_count*200/2)
-
-            hue_interval = 360 / col_count
-
-            # iterate over all colors
-            for i in range(col_count):
-                x_pos = lvl_pos.x + 400
-                y_pos = top_y + (200 * i)
-
-                # count_pos = float2(x_pos, y_pos)
-
-                grad_pos = float2(x_pos+200, y_pos)
-                out_pos = float2(x_pos+400, y_pos)
-
-                count_grad = comp_graph.newNode(gradient_id)
-                count_grad.setPosition(grad_pos)
-
-                # grad nodes start with no value
-                # Add grad points to array
-                # bot
-                val_struct = SDValueStruct.sNew(
-                    SDTypeStruct.sNew("sbs::compositing::gradient_key_rgba")
-                )
-
-                hue = i * hue_interval
-                # Converting to percentage
-                hue /= 360
-                rgb = hsv_to_rgb(hue, .25, .75)
-                new_rgb = ColorRGBA(rgb[0], rgb[1], rgb[2], 1)
-
-                val_rgb = SDValueColorRGBA.sNew(new_rgb)
-                val_struct.setPropertyValueFromId("value", val_rgb)
-                val_struct.setPropertyValueFromId("position", SDValueFloat.sNew(1))
-                val_struct.setPropertyValueFromId("midpoint", SDValueFloat.sNew(-1))
-
-                # Top
-                val_struct2 = SDValueStruct.sNew(
-                    SDTypeStruct.sNew("sbs::compositing::gradient_key_rgba")
-                )
-                rgb2 = hsv_to_rgb(hue, .5, .25)
-                new_rgb2 = ColorRGBA(rgb2[0], rgb2[1], rgb2[2], 1)
-
-                val_rgb2 = SDValueColorRGBA.sNew(new_rgb2)
-                val_struct2.setPropertyValueFromId("value", val_rgb2)
-                val_struct2.setPropertyValueFromId("position", SDValueFloat.sNew(0))
-                val_struct2.setPropertyValueFromId("midpoint", SDValueFloat.sNew(-1))
-
-                # Setup value array and add gradient points
-                val_arr = SDValueArray.sNew(
-                    SDTypeStruct.sNew("sbs::compositing::gradient_key_rgba"), 0
-                )
-                val_arr.pushBack(val_struct)
-                val_arr.pushBack(val_struct2)
-
-                count_grad.setInputPropertyValueFromId(
-                    'gradientrgba', val_arr
-                )
-
-                lvl_node.newPropertyConnectionFromId(
-                    "unique_filter_output", count_grad, "input1"
-                )
-
-                count_out = comp_graph.newNode(output_id)
-                count_out.setPosition(out_pos)
-                count_grad.newPropertyConnectionFromId(
-                    "unique_filter_output", count_out, "inputNodeOutput"
-                )
-                count_out.setAnnotationPropertyValueFromId(
-                    "identifier", SDValueString.sNew(f"COL_{i+1}")
-                )
-                comp_graph.compute()
-                return
-
-        # Get initial positions
-        col_pos = col_map_node.getPosition()
-        top_y = col_pos.y - (col_count * 200 / 2)
-
-        for i in range(col_count):
-            x_pos = col_pos.x + 400
-            y_pos = top_y + (200 * i)
-            uniform_node = comp_graph.newNode(uniform_id)
-            uniform_node.setPosition(float2(x_pos, y_pos))
-
-            # Get colors from user assigned list
-            if custom_col:
-                color = custom_window.color_list.item(i).data(Qt.UserRole)
-
-                # Convert to substance color if coming from QColorPicker
-                # QColor(0-255) -> ColorRGBA(0.0-1.0)
-                sd_color = color if is_pantone else SDValueColorRGBA.sNew(
-                    ColorRGBA(
-                        color.red()/255,
-                        color.green()/255,
-                        color.blue()/255,
-                        1)
-                )
-
-            # Get colors from spread
-            else:
-                hue_interval = 360 / col_count
-                hue = i * hue_interval
-
-                # Converting to percentage
-                hue /= 360
-                rgb = hsv_to_rgb(hue, .25, .75)
-                sd_color = SDValueColorRGBA.sNew(
-                    ColorRGBA(rgb[0], rgb[1], rgb[2], 1)
-                )
-
-                if is_pantone:
-                    # convert to pantone colors
-                    sd_color = spotLib.findClosestSpotColor(
-                        color_mode_window.book_dropdown.currentText(),
-                        r=rgb[0],
-                        g=rgb[1],
-                        b=rgb[2]
-                    )
-
-            # Node setup
-            uniform_node.setInputPropertyValueFromId('outputcolor', sd_color)
-
-            col_match = comp_graph.newInstanceNode(
-                color_match_pack.findResourceFromUrl(color_match_name)
-            )
-            col_match.setPosition(float2(x_pos+200, y_pos))
-            col_match.setInputPropertyValueFromId(
-                "target_color_mode",
-                SDValueInt.sNew(1)
-            )
-            col_match.setInputPropertyValueFromId(
-                "use_mask",
-                SDValueBool.sNew(False)
-            )
-
-            # Connect source color, target color to color match
-            col_map_node.newPropertyConnectionFromId(
-                "unique_filter_output", col_match, "input"
-            )
-            uniform_node.newPropertyConnectionFromId(
-                "unique_filter_output", col_match, "input_target_color"
-            )
-
-            # Connect color match to output
-            count_out = comp_graph.newNode(output_id)
-            out_pos = float2(x_pos + 400, y_pos)
-            count_out.setPosition(out_pos)
-
-            col_match.newPropertyConnectionFromId(
-                "output", count_out, "inputNodeOutput"
-            )
-            count_out.setAnnotationPropertyValueFromId(
-                "identifier", SDValueString.sNew(f"COL_{i + 1}")
+            if directory:
+                export_variants(comp_graph, directory)
+
+    elif spread_mode == SPREAD_ATLAS and sd_colors:
+        export = QMessageBox.question(
+            mainWin,
+            "Palette Atlas",
+            "Export the atlas and its layout now?"
+        )
+        if export == QMessageBox.Yes:
+            directory = QFileDialog.getExistingDirectory(
+                mainWin, "Atlas Export Folder"
             )
-
-        # Compute the new nodes
-        comp_graph.compute()
-
-    @classmethod
-    def __onToolbarDeleted(cls, graphViewID):
-        del cls.__toolbarList[graphViewID]
-
-    @classmethod
-    def removeAllToolbars(cls):
-        for toolbar in cls.__toolbarList.values():
-            if toolbar():
-                toolbar().deleteLater()
-
-
-def onNewGraphViewCreated(graphViewID, uiMgr):
-    toolbar = PluginToolBar(graphViewID, uiMgr)
-    uiMgr.addToolbarToGraphView(
-        graphViewID,
-        toolbar,
-        tooltip=toolbar.tooltip())
-
-
-graphViewCreatedCallbackID = 0
+            if directory:
+                for atlas_out in created['outputs']:
+                    export_atlas(comp_graph, atlas_out, directory)
 
 
 def initializeSDPlugin():
-    ctx = sd.getContext()
-    app = ctx.getSDApplication()
-    uiMgr = app.getQtForPythonUIMgr()
-
-    if uiMgr:
-        global graphViewCreatedCallbackID
-        graphViewCreatedCallbackID = uiMgr.registerGraphViewCreatedCallback(
-            partial(onNewGraphViewCreated, uiMgr=uiMgr))
+    runtime.register_action(
+        "color_mixer",
+        icons.icon_path(__file__, 'color_mixer.png'),
+        "Setup Node structure for color adjustment. The nodes are "
+        "given default values for manual adjustment",
+        color_mixer
+    )
 
 
 def uninitializeSDPlugin():
-    ctx = sd.getContext()
-    app = ctx.getSDApplication()
-    uiMgr = app.getQtForPythonUIMgr()
-
-    if uiMgr:
-        global graphViewCreatedCallbackID
-        uiMgr.unregisterCallback(graphViewCreatedCallbackID)
-        PluginToolBar.removeAllToolbars()
+    runtime.unregister_action("color_mixer")
@@ -0,0 +1,149 @@
+"""Palette atlas, every variant of a spread tiled into a single output.
+
+Each color_match result is scaled down into its own cell with a
+transformation node and the cells are summed with add blends. Reviewing a
+spread then needs one render and one file write instead of one per color.
+``export_atlas`` saves the atlas with a JSON sidecar describing the grid,
+which ``texture_tools.atlas`` uses to slice it back into per color files.
+"""
+import json
+from math import ceil, sqrt
+from pathlib import Path
+
+from sd.api.sdproperty import SDPropertyCategory
+from sd.api.sdbasetypes import float2, float4
+from sd.api.sdvaluefloat2 import SDValueFloat2
+from sd.api.sdvaluefloat4 import SDValueFloat4
+from sd.api.sdvaluestring import SDValueString
+
+from plugin_common.values import sd_int, sd_string
+
+
+ATLAS_OUTPUT_PREFIX = 'COL_ATLAS'
+
+# Atomic node settings
+NO_TILING = 0
+BLEND_ADD = 1
+
+
+def atlas_grid(count):
+    """Columns and rows of the smallest near square grid holding count"""
+    columns = max(1, int(ceil(sqrt(count))))
+    rows = max(1, int(ceil(count / columns)))
+    return columns, rows
+
+
+def cell_transform(index, columns, rows):
+    """Scale and offset placing a full image into cell index
+
+    Cells are filled left to right, top to bottom. Offsets are in UV
+    space relative to the image center, like the transformation node.
+    """
+    column = index % columns
+    row = index // columns
+    scale = float4(1 / columns, 0, 0, 1 / rows)
+    offset = float2(
+        (column + 0.5) / columns - 0.5,
+        (row + 0.5) / rows - 0.5
+    )
+    return scale, offset
+
+
+def build_atlas(comp_graph, variant_nodes, positions, out_pos, palette,
+                identifier=ATLAS_OUTPUT_PREFIX):
+    """Tile the variant nodes into one atlas output
+
+    variant_nodes are the color_match nodes, positions holds a
+    (transform, blend) position pair for each of them.
+    Returns the atlas output node.
+    """
+    columns, rows = atlas_grid(len(variant_nodes))
+    previous = None
+
+    for i, (variant, (trans_pos, blend_pos)) in enumerate(
+            zip(variant_nodes, positions)):
+        scale, offset = cell_transform(i, columns, rows)
+
+        trans = comp_graph.newNode('sbs::compositing::transformation')
+        trans.setPosition(float2(*trans_pos))
+        trans.setInputPropertyValueFromId(
+            'matrix22', SDValueFloat4.sNew(scale)
+        )
+        trans.setInputPropertyValueFromId(
+            'offset', SDValueFloat2.sNew(offset)
+        )
+        trans.setInputPropertyValueFromId(
+            'tiling', sd_int(NO_TILING)
+        )
+        variant.newPropertyConnectionFromId("output", trans, "input1")
+
+        if previous is None:
+            previous = trans
+            continue
+
+        blend = comp_graph.newNode('sbs::compositing::blend')
+        blend.setPosition(float2(*blend_pos))
+        blend.setInputPropertyValueFromId(
+            'blendingmode', sd_int(BLEND_ADD)
+        )
+        trans.newPropertyConnectionFromId(
+            "unique_filter_output", blend, "source"
+        )
+        previous.newPropertyConnectionFromId(
+            "unique_filter_output", blend, "destination"
+        )
+        previous = blend
+
+    atlas_out = comp_graph.newNode('sbs::compositing::output')
+    atlas_out.setPosition(float2(*out_pos))
+    previous.newPropertyConnectionFromId(
+        "unique_filter_output", atlas_out, "inputNodeOutput"
+    )
+    atlas_out.setAnnotationPropertyValueFromId(
+        "identifier", sd_string(identifier)
+    )
+    atlas_out.setAnnotationPropertyValueFromId(
+        "description",
+        SDValueString.sNew(json.dumps(atlas_layout(palette)))
+    )
+    return atlas_out
+
+
+def atlas_layout(palette):
+    """Sidecar data describing how the atlas is tiled"""
+    columns, rows = atlas_grid(len(palette))
+    return {
+        'columns': columns,
+        'rows': rows,
+        'count': len(palette),
+        'palette': palette,
+    }
+
+
+def export_atlas(comp_graph, atlas_out, directory, file_format='tga'):
+    """Save the cooked atlas and its layout sidecar, return the image path"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    identifier = atlas_out.getAnnotationPropertyValueFromId(
+        'identifier').get()
+    layout = json.loads(
+        atlas_out.getAnnotationPropertyValueFromId('description').get()
+    )
+
+    source = atlas_out.getPropertyConnections(
+        atlas_out.getPropertyFromId(
+            'inputNodeOutput', SDPropertyCategory.Input
+        )
+    )[0].getInputPropertyNode()
+    source_prop = source.getPropertyFromId(
+        'unique_filter_output', SDPropertyCategory.Output
+    )
+
+    comp_graph.compute()
+    image_path = directory.joinpath(f"{identifier}.{file_format}")
+    source.getPropertyValue(source_prop).get().save(image_path.as_posix())
+
+    with open(image_path.with_suffix('.json'), 'w') as f:
+        json.dump(layout, f, indent=4)
+    return image_path
@@ -0,0 +1,137 @@
+"""Apply one palette to many graphs or many color nodes in a single call.
+
+Run from Designer's Python editor or a farm script::
+
+    from color_mixer_plugin import batch
+    from plugin_common.packages import user_package_graphs
+    from texture_tools.palette import load_palette
+
+    colors = [rgb for _, rgb in load_palette('tcx_ss25.csv')]
+    results = batch.run_batch(user_package_graphs(), colors)
+    print(batch.summarize(results))
+
+Every target is timed and failures are recorded instead of stopping the
+run, which makes the results usable for throughput benchmarks as well.
+"""
+from collections import namedtuple
+import time
+
+import sd
+
+from plugin_common import graphdiff
+
+from .gradient import load_gradient_resources
+from .spread import SPREAD_GRADIENT, SPREAD_OUTPUTS, find_color_map, \
+    load_color_match, mix_colors, mix_colors_multi, to_sd_color
+
+
+BatchResult = namedtuple(
+    'BatchResult', ['graph', 'node', 'created', 'seconds', 'error']
+)
+
+
+def _targets(targets, map_type):
+    """Expand graphs into (graph, color node) pairs"""
+    for target in targets:
+        if isinstance(target, tuple):
+            yield target
+        else:
+            yield target, find_color_map(target, map_type)
+
+
+def run_batch(targets, colors, spread_mode=SPREAD_OUTPUTS, map_outputs=True,
+              map_type='COL', report_path=None):
+    """Build the same spread on every target
+
+    targets are graphs, whose color map is found by its resource suffix,
+    or (graph, color node) pairs. With report_path the changes made to
+    every graph are written there as JSON, see ``graphdiff``.
+    Returns one BatchResult per target.
+    """
+    sd_application = sd.getContext().getSDApplication()
+    color_match = gradient_resources = None
+    if spread_mode == SPREAD_GRADIENT:
+        gradient_resources = load_gradient_resources(sd_application)
+    else:
+        color_match = load_color_match(sd_application)
+    # Convert once, the same values are set on every graph
+    sd_colors = [to_sd_color(color) for color in colors]
+
+    results = []
+    diffs = []
+    for graph, node in _targets(targets, map_type):
+        before = graphdiff.snapshot(graph) if report_path else None
+        start = time.perf_counter()
+        if node is None:
+            error = f"skipped: no {map_type} bitmap"
+            results.append(BatchResult(graph, None, None, 0.0, error))
+            if before is not None:
+                # Nothing changed, listed so the report covers every graph
+                graph_diff = graphdiff.diff(before, before)
+                graph_diff['error'] = error
+                diffs.append(graph_diff)
+            continue
+
+        try:
+            graph.compute()
+            created = mix_colors(
+                graph, node, sd_colors, spread_mode, map_outputs,
+                color_match_resource=color_match,
+                gradient_resources=gradient_resources
+            )
+            error = None
+        except Exception as e:
+            created, error = None, str(e)
+        results.append(BatchResult(
+            graph, node, created, time.perf_counter() - start, error
+        ))
+
+        if before is not None:
+            graph_diff = graphdiff.diff(before, graphdiff.snapshot(graph))
+            graph_diff['error'] = error
+            diffs.append(graph_diff)
+
+    if report_path:
+        graphdiff.write_report(diffs, report_path)
+    return results
+
+
+def run_on_selection(colors, spread_mode=SPREAD_OUTPUTS):
+    """Build one shared spread for all selected nodes of the current graph
+
+    Returns a single BatchResult covering the whole selection.
+    """
+    uimgr = sd.getContext().getSDApplication().getUIMgr()
+    graph = uimgr.getCurrentGraph()
+    selection = uimgr.getCurrentGraphSelection()
+    nodes = [selection[i] for i in range(selection.getSize())]
+
+    start = time.perf_counter()
+    try:
+        created = mix_colors_multi(
+            graph, nodes, colors, spread_mode, map_outputs=False
+        )
+        error = None
+    except Exception as e:
+        created, error = None, str(e)
+    return BatchResult(graph, nodes, created, time.perf_counter() - start,
+                       error)
+
+
+def summarize(results):
+    """Counts and timings of a batch run"""
+    done = [r for r in results if r.error is None]
+    seconds = sum(r.seconds for r in results)
+    nodes = sum(
+        len(nodes) for r in done for nodes in r.created.values()
+    )
+    return {
+        'targets': len(results),
+        'succeeded': len(done),
+        'failed': len(results) - len(done),
+        'nodes_created': nodes,
+        'seconds': round(seconds, 3),
+        'targets_per_second': round(len(results) / seconds, 3)
+        if seconds else 0.0,
+        'errors': [r.error for r in results if r.error],
+    }
@@ -0,0 +1,150 @@
+"""Gradient map spreads, one grayscale chain fanned out to every color.
+
+The source map goes through grayscale_conversion_advanced -> auto_levels
+-> levels once, and each target color is a gradient node reading the
+levels output. A gradient node is far cheaper to cook than a color_match
+instance, which makes this the mode of choice for large spreads.
+The levels node is left at its defaults for manual adjustment.
+"""
+from colorsys import hsv_to_rgb, rgb_to_hsv
+from pathlib import Path
+
+from sd.api.sdapplication import SDApplicationPath
+from sd.api.sdbasetypes import float2, ColorRGBA
+from sd.api.sdvaluearray import SDValueArray
+from sd.api.sdvaluecolorrgba import SDValueColorRGBA
+from sd.api.sdvaluestruct import SDValueStruct
+
+from plugin_common import naming
+from plugin_common.values import sd_float, sd_string, sd_type_struct
+
+from .variants import color_to_tuple, output_identifiers, \
+    unique_identifier
+
+
+GRAYSCALE_CONVERSION = 'grayscale_conversion_advanced'
+AUTO_LEVELS = 'auto_levels'
+
+LEVELS_ID = 'sbs::compositing::levels'
+GRADIENT_ID = 'sbs::compositing::gradient'
+OUTPUT_ID = 'sbs::compositing::output'
+GRADIENT_KEY_TYPE = 'sbs::compositing::gradient_key_rgba'
+
+
+def library_resource(sd_application, name):
+    """Graph name from the package of the same name in Designer's library"""
+    resource_path = sd_application.getPath(
+        SDApplicationPath.DefaultResourcesDir
+    )
+    package = sd_application.getPackageMgr().loadUserPackage(
+        Path(resource_path).joinpath('packages', f'{name}.sbs').as_posix()
+    )
+    return package.findResourceFromUrl(name)
+
+
+def load_gradient_resources(sd_application):
+    """The (grayscale conversion, auto levels) resources of the chain"""
+    return (
+        library_resource(sd_application, GRAYSCALE_CONVERSION),
+        library_resource(sd_application, AUTO_LEVELS),
+    )
+
+
+def shadow_color(rgb):
+    """Dark end of a gradient, twice the saturation and a third the value
+
+    For the default hue spread colors this is the (.5, .25) saturation
+    and value shadow the gradient mode always used.
+    """
+    h, s, v = rgb_to_hsv(*rgb)
+    return hsv_to_rgb(h, min(1.0, s * 2), v / 3)
+
+
+def _gradient_key(rgb, position):
+    key = SDValueStruct.sNew(sd_type_struct(GRADIENT_KEY_TYPE))
+    key.setPropertyValueFromId(
+        "value", SDValueColorRGBA.sNew(ColorRGBA(*rgb, 1))
+    )
+    key.setPropertyValueFromId("position", sd_float(position))
+    key.setPropertyValueFromId("midpoint", sd_float(-1))
+    return key
+
+
+def gradient_keys(sd_colors):
+    """Gradient key arrays for sd_colors, shadow at 0 and the color at 1
+
+    Built up front so the node loop only sets finished values.
+    """
+    key_type = sd_type_struct(GRADIENT_KEY_TYPE)
+    arrays = []
+    for sd_color in sd_colors:
+        rgb = color_to_tuple(sd_color)[:3]
+        keys = SDValueArray.sNew(key_type, 0)
+        keys.pushBack(_gradient_key(shadow_color(rgb), 0))
+        keys.pushBack(_gradient_key(rgb, 1))
+        arrays.append(keys)
+    return arrays
+
+
+def build_gradient_spread(comp_graph, col_map_node, key_arrays, resources,
+                          chain_pos, spread_rows, name_prefix=''):
+    """Build the shared grayscale chain and one gradient map per key array
+
+    chain_pos holds the grayscale, auto levels and levels positions,
+    spread_rows a (gradient, output) position pair per key array.
+    Outputs are named by the naming convention's variant, with a suffix
+    when the graph already has an output of that name. Returns the
+    created nodes as a dict of lists with the keys 'preprocess',
+    'gradients' and 'outputs'.
+    """
+    gray_conv_resource, auto_lvl_resource = resources
+    gray_pos, alvl_pos, lvl_pos = chain_pos
+
+    gray_conv = comp_graph.newInstanceNode(gray_conv_resource)
+    gray_conv.setPosition(float2(*gray_pos))
+    auto_lvl = comp_graph.newInstanceNode(auto_lvl_resource)
+    auto_lvl.setPosition(float2(*alvl_pos))
+    lvl_node = comp_graph.newNode(LEVELS_ID)
+    lvl_node.setPosition(float2(*lvl_pos))
+
+    col_map_node.newPropertyConnectionFromId(
+        "unique_filter_output", gray_conv, "input"
+    )
+    gray_conv.newPropertyConnectionFromId(
+        "output", auto_lvl, "Input"
+    )
+    auto_lvl.newPropertyConnectionFromId(
+        "Output", lvl_node, "input1"
+    )
+
+    convention = naming.default_convention()
+    taken = output_identifiers(comp_graph)
+    created = {
+        'preprocess': [gray_conv, auto_lvl, lvl_node],
+        'gradients': [],
+        'outputs': [],
+    }
+    for i, (keys, (grad_pos, out_pos)) in enumerate(
+            zip(key_arrays, spread_rows)):
+        count_grad = comp_graph.newNode(GRADIENT_ID)
+        count_grad.setPosition(float2(*grad_pos))
+        count_grad.setInputPropertyValueFromId('gradientrgba', keys)
+        lvl_node.newPropertyConnectionFromId(
+            "unique_filter_output", count_grad, "input1"
+        )
+
+        count_out = comp_graph.newNode(OUTPUT_ID)
+        count_out.setPosition(float2(*out_pos))
+        count_grad.newPropertyConnectionFromId(
+            "unique_filter_output", count_out, "inputNodeOutput"
+        )
+        count_out.setAnnotationPropertyValueFromId(
+            "identifier",
+            sd_string(unique_identifier(
+                comp_graph, convention.variant_name(i + 1, name_prefix),
+                taken
+            ))
+        )
+        created['gradients'].append(count_grad)
+        created['outputs'].append(count_out)
+    return created
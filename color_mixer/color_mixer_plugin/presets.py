@@ -0,0 +1,150 @@
+"""Saved palette presets.
+
+A preset holds everything the option dialogs ask for::
+
+    {
+        "mode": 0,                      # spread mode, see spread.py
+        "pantone": true,
+        "book": "PANTONE FHI Cotton TCX",
+        "count": 6,                     # hue spread size
+        "colors": [                     # custom colors, empty for spreads
+            {"name": "PANTONE 19-1664 TCX",
+             "book": "PANTONE FHI Cotton TCX",
+             "rgb": [0.62, 0.16, 0.21]}
+        ]
+    }
+
+Spot colors are resolved again by book and name when loaded, ``rgb`` is
+the fallback when the book is not available. All presets live in one
+compact JSON file kept in memory, it is only read again when it changed
+on disk.
+"""
+import json
+import os
+from pathlib import Path
+
+import sd
+from sd.api.sdvaluecolorrgba import SDValueColorRGBA
+from sd.api.sdbasetypes import ColorRGBA
+
+from .spread import SPREAD_OUTPUTS, mix_colors, spread_colors
+
+
+PRESETS_FILE = Path(os.environ.get(
+    'COLOR_MIXER_PRESETS',
+    Path.home().joinpath('.color_mixer', 'presets.json')
+))
+
+
+class PresetStore(object):
+    """In memory index of the presets file"""
+
+    def __init__(self, path=PRESETS_FILE):
+        self.path = Path(path)
+        self._presets = {}
+        self._mtime = None
+
+    def _refresh(self):
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            self._presets, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(self.path) as f:
+                self._presets = json.load(f)
+            self._mtime = mtime
+
+    def names(self):
+        self._refresh()
+        return sorted(self._presets, key=str.lower)
+
+    def get(self, name):
+        self._refresh()
+        return self._presets.get(name)
+
+    def save(self, name, preset):
+        self._refresh()
+        self._presets[name] = preset
+        self._write()
+
+    def delete(self, name):
+        self._refresh()
+        if self._presets.pop(name, None) is not None:
+            self._write()
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._presets, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self._mtime = self.path.stat().st_mtime
+
+
+# Shared by the dialogs and the headless API
+store = PresetStore()
+
+
+def make_preset(mode, pantone, book, count, colors=()):
+    return {
+        'mode': mode,
+        'pantone': pantone,
+        'book': book,
+        'count': count,
+        'colors': list(colors),
+    }
+
+
+def color_entry(name, rgb, book=None):
+    """Preset entry for a custom color, book is set for spot colors"""
+    return {'name': name, 'book': book, 'rgb': [round(c, 6) for c in rgb]}
+
+
+def resolve_entry(entry, spot_lib):
+    """Preset color entry -> SD color, spot colors looked up by name"""
+    if entry.get('book') and spot_lib:
+        col = spot_lib.findSpotColorByName(
+            spotColorBookName=entry['book'],
+            spotColorName=entry['name']
+        )
+        if col:
+            return col
+        print(f"Spot color {entry['name']} not found, using stored RGB")
+    r, g, b = entry['rgb']
+    return SDValueColorRGBA.sNew(ColorRGBA(r, g, b, 1))
+
+
+def resolve_colors(preset, spot_lib):
+    """All SD colors of a preset"""
+    if preset['colors']:
+        return [resolve_entry(entry, spot_lib) for entry in preset['colors']]
+    return spread_colors(
+        preset['count'],
+        spot_lib,
+        preset['book'] if preset['pantone'] else None
+    )
+
+
+def apply_preset(comp_graph, col_map_node, name, preset_store=None):
+    """Build the spread of a saved preset on col_map_node, no dialogs
+
+    Returns the created nodes, see ``spread.build_spread``.
+    """
+    preset = (preset_store or store).get(name)
+    if preset is None:
+        raise KeyError(f"No palette preset named {name}")
+
+    sd_application = sd.getContext().getSDApplication()
+    sd_colors = resolve_colors(
+        preset, sd_application.getSpotColorLibrary()
+    )
+
+    comp_graph.compute()
+    # mix_colors loads color_match only for the modes using it
+    return mix_colors(
+        comp_graph,
+        col_map_node,
+        sd_colors,
+        preset.get('mode', SPREAD_OUTPUTS)
+    )
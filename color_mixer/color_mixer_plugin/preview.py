@@ -0,0 +1,176 @@
+"""CPU preview thumbnails for the color dialogs.
+
+The selected color map is cooked once and every few pixels of it are
+read straight from the texture's buffer, nothing is written to disk.
+Each picked color is then applied to that small copy
+with the Lab transfer from ``texture_tools.color_transfer``, which is
+close enough to color_match to reject a bad palette before building the
+graph. Thumbnails are kept in a size bounded LRU keyed by the source
+image hash and the target color.
+
+NumPy is optional inside Designer, without it, or when the map can't be
+read, the dialogs fall back to plain color swatches.
+"""
+from collections import OrderedDict
+import ctypes
+import hashlib
+import logging
+
+from sd.api.sdproperty import SDPropertyCategory
+
+from PySide2.QtCore import Qt
+from PySide2.QtGui import QImage, QPixmap
+
+try:
+    import numpy as np
+    from texture_tools.color_transfer import rgb_to_lab, lab_stats, \
+        transfer_lab, lab_to_rgb
+except ImportError:
+    np = None
+
+
+THUMBNAIL_SIZE = 64
+
+# Source copy used for previews, a thumbnail is computed from this
+SOURCE_SIZE = 128
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailCache(object):
+    """LRU of thumbnails bounded by the total bytes of their pixels"""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        pixmap = self._items.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self._items:
+            self.size -= _pixmap_bytes(self._items.pop(key))
+        self._items[key] = pixmap
+        self.size += _pixmap_bytes(pixmap)
+
+        while self.size > self.max_bytes and len(self._items) > 1:
+            _, evicted = self._items.popitem(last=False)
+            self.size -= _pixmap_bytes(evicted)
+
+
+def _pixmap_bytes(pixmap):
+    return pixmap.width() * pixmap.height() * 4
+
+
+# Shared by every dialog for the whole session
+_cache = ThumbnailCache()
+
+
+class PreviewSource(object):
+    """Downsampled color map with precomputed Lab statistics"""
+    __slots__ = ('key', 'alpha', 'lab', 'stats')
+
+    def __init__(self, rgba):
+        self.key = hashlib.blake2b(rgba.tobytes(), digest_size=16).hexdigest()
+        rgba = rgba.astype(np.float32) / 255
+        self.alpha = rgba[..., 3:]
+        self.lab = rgb_to_lab(rgba[..., :3])
+        self.stats = lab_stats(self.lab)
+
+    def thumbnail(self, rgb):
+        """QPixmap of the source recolored to rgb (floats 0-1)"""
+        target = tuple(round(c, 4) for c in rgb[:3])
+        key = (self.key, target)
+
+        pixmap = _cache.get(key)
+        if pixmap is None:
+            target_lab = rgb_to_lab(np.array(target, dtype=np.float32))
+            result = lab_to_rgb(transfer_lab(self.lab, self.stats, target_lab))
+            pixmap = _to_pixmap(np.concatenate([result, self.alpha], axis=-1))
+            _cache.put(key, pixmap)
+        return pixmap
+
+
+def _to_pixmap(rgba):
+    data = np.ascontiguousarray((rgba * 255 + 0.5).astype(np.uint8))
+    height, width = data.shape[:2]
+    image = QImage(data.data, width, height, width * 4,
+                   QImage.Format_RGBA8888)
+    # copy() detaches the image from the NumPy buffer
+    return QPixmap.fromImage(image.copy()).scaled(
+        THUMBNAIL_SIZE, THUMBNAIL_SIZE,
+        Qt.KeepAspectRatio, Qt.SmoothTransformation
+    )
+
+
+def _texture_pixels(texture):
+    """Every few pixels of an 8 bit texture, (h, w, 4) uint8 RGBA
+
+    Reads about SOURCE_SIZE pixels per side from the pixel buffer, an 8K
+    map is never copied whole.
+    """
+    width, height = texture.getSize().x, texture.getSize().y
+    channels = texture.getBytesPerPixel()
+    if channels not in (1, 4):
+        # 16 bit and float maps, previews are for 8 bit color maps
+        return None
+
+    size = width * height * channels
+    buffer = (ctypes.c_uint8 * size).from_address(
+        texture.getPixelBufferAddress()
+    )
+    pixels = np.frombuffer(buffer, dtype=np.uint8, count=size)
+    step = max(1, -(-max(width, height) // SOURCE_SIZE))
+    pixels = pixels.reshape(height, width, channels)[::step, ::step]
+    if channels == 1:
+        rgba = np.empty(pixels.shape[:2] + (4,), dtype=np.uint8)
+        rgba[..., :3] = pixels
+        rgba[..., 3] = 255
+        return rgba
+    # Designer keeps 8 bit color as BGRA
+    return pixels[..., [2, 1, 0, 3]].copy()
+
+
+def load_source(node):
+    """Build a PreviewSource from a cooked node, None if unavailable
+
+    The preview is optional, any failure only costs the thumbnails.
+    """
+    if np is None:
+        return None
+
+    try:
+        output_props = node.getProperties(SDPropertyCategory.Output)
+        if not output_props:
+            return None
+        value = node.getPropertyValue(output_props[0])
+        texture = value.get() if value else None
+        if texture is None:
+            return None
+        rgba = _texture_pixels(texture)
+        return None if rgba is None else PreviewSource(rgba)
+    except Exception:
+        logger.warning("No preview source for %s", node.getIdentifier(),
+                       exc_info=True)
+        return None
+
+
+def cache_stats():
+    return {
+        'hits': _cache.hits,
+        'misses': _cache.misses,
+        'items': len(_cache),
+        'bytes': _cache.size,
+    }
@@ -0,0 +1,437 @@
+"""Graph construction for color_mixer, without any dialog.
+
+``color_mixer`` collects its options through dialogs and hands them over
+to the functions here, presets and scripts call them directly. From a
+script, ``mix_colors`` is the whole tool in one call::
+
+    from color_mixer_plugin.spread import mix_colors, SPREAD_ATLAS
+
+    created = mix_colors(graph, col_node, ['#c83a2f', (0.2, 0.4, 0.6)],
+                         spread_mode=SPREAD_ATLAS)
+"""
+from pathlib import Path
+
+import sd
+from sd.api.sdbasetypes import float2
+from sd.api.sdvaluecolorrgba import SDValueColorRGBA
+from sd.api.sdbasetypes import ColorRGBA
+
+from plugin_common import naming
+from plugin_common.layout import LayoutPlanner
+from plugin_common.values import sd_bool, sd_int, sd_string
+from texture_tools.palette import hue_spread, parse_color
+
+from .atlas import ATLAS_OUTPUT_PREFIX, build_atlas
+from .gradient import build_gradient_spread, gradient_keys, \
+    library_resource, load_gradient_resources
+from .variants import build_compact_spread, color_to_tuple, \
+    output_identifier, output_identifiers, unique_identifier
+
+
+# Spreads taller than this wrap into another column
+MAX_SPREAD_ROWS = 20
+
+# Spread modes, in the order shown in the options dialog
+SPREAD_OUTPUTS = 0
+SPREAD_COMPACT = 1
+SPREAD_ATLAS = 2
+SPREAD_GRADIENT = 3
+SPREAD_MODES = [
+    "One output per color",
+    "Compact (single chain, export variants)",
+    "Atlas (single tiled output)",
+    "Gradient map (shared grayscale chain)",
+]
+
+UNIFORM_ID = 'sbs::compositing::uniform'
+OUTPUT_ID = 'sbs::compositing::output'
+
+
+def load_color_match(sd_application):
+    """Return the color_match resource from Designer's default library"""
+    return library_resource(sd_application, 'color_match')
+
+
+def spread_colors(count, spot_lib=None, pantone_book=None):
+    """SD colors of a hue spread, snapped to a Pantone book if given"""
+    sd_colors = []
+    for _, rgb in hue_spread(count):
+        if pantone_book:
+            # convert to pantone colors
+            sd_colors.append(spot_lib.findClosestSpotColor(
+                pantone_book,
+                r=rgb[0],
+                g=rgb[1],
+                b=rgb[2]
+            ))
+        else:
+            sd_colors.append(SDValueColorRGBA.sNew(
+                ColorRGBA(rgb[0], rgb[1], rgb[2], 1)
+            ))
+    return sd_colors
+
+
+def bitmap_type(node):
+    """Map type of a Bitmap from its resource suffix, e.g. fabric-COL"""
+    resource = node.getReferencedResource()
+    if not resource:
+        return None
+    return Path(resource.getFilePath()).stem.split('-')[-1].upper()
+
+
+def add_map_outputs(comp_graph, col_map_nodes, planner):
+    """Connect every other Bitmap to an output named after its map type
+
+    The map type goes through the naming convention, so a client table
+    can rename NRM and the like. Map types that already have an output
+    are skipped, so running the tool again on the same graph adds
+    nothing.
+    """
+    skip = {node.getIdentifier() for node in col_map_nodes}
+    taken = set()
+    bitmaps = []
+    # Single pass, collecting output identifiers and candidate Bitmaps
+    for node in comp_graph.getNodes():
+        definition = node.getDefinition()
+        if definition.getId() == OUTPUT_ID:
+            taken.add(output_identifier(node))
+        elif definition.getLabel() == 'Bitmap' and \
+                node.getIdentifier() not in skip:
+            bitmaps.append(node)
+
+    convention = naming.default_convention()
+    created = []
+    for node in bitmaps:
+        identifier = bitmap_type(node)
+        if not identifier:
+            continue
+        identifier = convention.output_name(identifier)
+        if identifier in taken:
+            continue
+        taken.add(identifier)
+
+        # Connect other maps to output and label
+        map_out = comp_graph.newNode(OUTPUT_ID)
+        npos = node.getPosition()
+        new_pos = planner.place_nodes(
+            (npos.x, npos.y), 1, x_offset=planner.step
+        )[0]
+        map_out.setPosition(float2(*new_pos))
+
+        node.newPropertyConnectionFromId(
+            "unique_filter_output", map_out, "inputNodeOutput"
+        )
+        map_out.setAnnotationPropertyValueFromId(
+            "identifier", sd_string(identifier)
+        )
+        created.append(map_out)
+    return created
+
+
+def source_name(node, index):
+    """Short name of the index-th source node used to prefix its outputs
+
+    The resource stem of a Bitmap without its map type, fabric-COL gives
+    fabric, else SRC<index>. Only the source goes in the prefix, the
+    naming convention adds its own variant name after it.
+    """
+    if node.getDefinition().getLabel() == 'Bitmap':
+        resource = node.getReferencedResource()
+        if resource:
+            stem = Path(resource.getFilePath()).stem.rsplit('-', 1)[0]
+            name = ''.join(c if c.isalnum() else '_' for c in stem)
+            if name:
+                return name
+    return f"SRC{index}"
+
+
+def source_names(nodes):
+    """``source_name`` of every node, numbered where two would match
+
+    Two Bitmaps of fabric.sbs become fabric and fabric_2, so their
+    outputs don't collide.
+    """
+    names = []
+    for index, node in enumerate(nodes, 1):
+        name = source_name(node, index)
+        unique = name
+        suffix = 2
+        while unique in names:
+            unique = f"{name}_{suffix}"
+            suffix += 1
+        names.append(unique)
+    return names
+
+
+def create_uniforms(comp_graph, sd_colors, positions):
+    """One uniform color node per color"""
+    uniforms = []
+    for sd_color, pos in zip(sd_colors, positions):
+        uniform_node = comp_graph.newNode(UNIFORM_ID)
+        uniform_node.setPosition(float2(*pos))
+        uniform_node.setInputPropertyValueFromId('outputcolor', sd_color)
+        uniforms.append(uniform_node)
+    return uniforms
+
+
+def build_spread(comp_graph, col_map_node, sd_colors, color_match_resource,
+                 spread_mode=SPREAD_OUTPUTS, planner=None, uniforms=None,
+                 name_prefix='', gradient_resources=None):
+    """Build the recolor branches of col_map_node for sd_colors
+
+    uniforms are existing uniform nodes to use as targets, one per color,
+    so several sources can share them. name_prefix is put in front of
+    the output identifiers. gradient_resources are the loaded
+    ``load_gradient_resources`` for the gradient mode. Returns the created
+    nodes as a dict of lists with the keys 'uniforms', 'color_matches'
+    and 'outputs', gradient spreads add 'preprocess' and 'gradients'.
+    """
+    created = {'uniforms': [], 'color_matches': [], 'outputs': []}
+    if not sd_colors:
+        return created
+
+    planner = planner or LayoutPlanner.from_graph(comp_graph)
+    col_pos = col_map_node.getPosition()
+
+    if spread_mode == SPREAD_COMPACT:
+        # Single chain, the variants are rendered one color at a time.
+        # The export step recolors the uniform, so it is never shared
+        chain_pos = planner.place_chains((col_pos.x, col_pos.y), 1, 3)[0]
+        uniform_node, col_match, count_out = build_compact_spread(
+            comp_graph,
+            col_map_node,
+            sd_colors,
+            color_match_resource,
+            chain_pos,
+            name_prefix
+        )
+        created['uniforms'].append(uniform_node)
+        created['color_matches'].append(col_match)
+        created['outputs'].append(count_out)
+        return created
+
+    if spread_mode == SPREAD_GRADIENT:
+        # One grayscale chain, then gradient -> output per row
+        if gradient_resources is None:
+            gradient_resources = load_gradient_resources(
+                sd.getContext().getSDApplication()
+            )
+        chain_pos = planner.place_chains((col_pos.x, col_pos.y), 1, 3)[0]
+        spread_rows = planner.place_chains(
+            chain_pos[-1], len(sd_colors), 2, max_rows=MAX_SPREAD_ROWS,
+            x_offset=planner.step
+        )
+        created.update(build_gradient_spread(
+            comp_graph,
+            col_map_node,
+            gradient_keys(sd_colors),
+            gradient_resources,
+            chain_pos,
+            spread_rows,
+            name_prefix
+        ))
+        return created
+
+    convention = naming.default_convention()
+    # Spreads run again or on another source get suffixed names
+    taken = output_identifiers(comp_graph)
+
+    # Get initial positions, uniform -> color match -> output per row.
+    # Atlas rows are uniform -> color match -> transform -> blend instead,
+    # shared uniforms are already placed
+    is_atlas = spread_mode == SPREAD_ATLAS
+    chain_length = 3 if is_atlas else 2
+    if uniforms is None:
+        chain_length += 1
+    spread_rows = planner.place_chains(
+        (col_pos.x, col_pos.y), len(sd_colors), chain_length,
+        max_rows=MAX_SPREAD_ROWS
+    )
+    if uniforms is None:
+        uniforms = create_uniforms(
+            comp_graph, sd_colors, [row[0] for row in spread_rows]
+        )
+        created['uniforms'] = uniforms
+        spread_rows = [row[1:] for row in spread_rows]
+
+    for i, uniform_node in enumerate(uniforms):
+        match_pos, out_pos = spread_rows[i][:2]
+
+        col_match = comp_graph.newInstanceNode(color_match_resource)
+        col_match.setPosition(float2(*match_pos))
+        col_match.setInputPropertyValueFromId(
+            "target_color_mode",
+            sd_int(1)
+        )
+        col_match.setInputPropertyValueFromId(
+            "use_mask",
+            sd_bool(False)
+        )
+
+        # Connect source color, target color to color match
+        col_map_node.newPropertyConnectionFromId(
+            "unique_filter_output", col_match, "input"
+        )
+        uniform_node.newPropertyConnectionFromId(
+            "unique_filter_output", col_match, "input_target_color"
+        )
+        created['color_matches'].append(col_match)
+
+        if is_atlas:
+            continue
+
+        # Connect color match to output
+        count_out = comp_graph.newNode(OUTPUT_ID)
+        count_out.setPosition(float2(*out_pos))
+
+        col_match.newPropertyConnectionFromId(
+            "output", count_out, "inputNodeOutput"
+        )
+        count_out.setAnnotationPropertyValueFromId(
+            "identifier",
+            sd_string(unique_identifier(
+                comp_graph, convention.variant_name(i + 1, name_prefix),
+                taken
+            ))
+        )
+        created['outputs'].append(count_out)
+
+    if is_atlas:
+        last_x = spread_rows[-1][-1][0]
+        created['outputs'].append(build_atlas(
+            comp_graph,
+            created['color_matches'],
+            [row[1:] for row in spread_rows],
+            planner.place_nodes(
+                (last_x, col_pos.y), 1, x_offset=planner.step
+            )[0],
+            [color_to_tuple(col) for col in sd_colors],
+            f"{name_prefix}{ATLAS_OUTPUT_PREFIX}"
+        ))
+    return created
+
+
+def to_sd_color(color):
+    """SD color value, hex string or RGB(A) sequence -> SD color value"""
+    if hasattr(color, 'get'):
+        return color
+    r, g, b = parse_color(color)
+    return SDValueColorRGBA.sNew(ColorRGBA(r, g, b, 1))
+
+
+def find_color_map(comp_graph, map_type='COL'):
+    """Return the Bitmap whose resource ends with map_type, e.g. fabric-COL"""
+    for node in comp_graph.getNodes():
+        if node.getDefinition().getLabel() == 'Bitmap' and \
+                bitmap_type(node) == map_type:
+            return node
+    return None
+
+
+def mix_colors(comp_graph, col_map_node, colors, spread_mode=SPREAD_OUTPUTS,
+               map_outputs=True, color_match_resource=None, compute=True,
+               gradient_resources=None):
+    """Build a full color spread on col_map_node, no UI involved
+
+    colors are SD color values, hex strings or RGB sequences. With
+    map_outputs the other Bitmaps get their outputs too, like the plugin
+    does. Returns the created nodes, see ``build_spread``.
+    """
+    if color_match_resource is None and spread_mode != SPREAD_GRADIENT:
+        color_match_resource = load_color_match(
+            sd.getContext().getSDApplication()
+        )
+
+    sd_colors = [to_sd_color(color) for color in colors]
+    planner = LayoutPlanner.from_graph(comp_graph)
+
+    map_nodes = []
+    if map_outputs:
+        map_nodes = add_map_outputs(comp_graph, [col_map_node], planner)
+
+    created = build_spread(
+        comp_graph,
+        col_map_node,
+        sd_colors,
+        color_match_resource,
+        spread_mode,
+        planner,
+        gradient_resources=gradient_resources
+    )
+    created['map_outputs'] = map_nodes
+
+    if compute:
+        comp_graph.compute()
+    return created
+
+
+def mix_colors_multi(comp_graph, col_map_nodes, colors,
+                     spread_mode=SPREAD_OUTPUTS, map_outputs=True,
+                     color_match_resource=None, compute=True):
+    """Build spreads for several sources sharing one set of uniforms
+
+    Every target color gets a single uniform node wired to all sources,
+    outputs are named ``<source>_`` and the convention's variant name,
+    fabric_COL_1 by default, see ``source_name``. Gradient spreads have no
+    uniforms, each source gets its own grayscale chain instead. The graph
+    is cooked once at the end. Returns the created nodes merged over all
+    sources.
+    """
+    if len(col_map_nodes) == 1:
+        return mix_colors(
+            comp_graph, col_map_nodes[0], colors, spread_mode, map_outputs,
+            color_match_resource, compute
+        )
+
+    sd_application = sd.getContext().getSDApplication()
+    if color_match_resource is None and spread_mode != SPREAD_GRADIENT:
+        color_match_resource = load_color_match(sd_application)
+
+    # Load the grayscale chain packages once for all sources
+    gradient_resources = None
+    if spread_mode == SPREAD_GRADIENT:
+        gradient_resources = load_gradient_resources(sd_application)
+
+    sd_colors = [to_sd_color(color) for color in colors]
+    planner = LayoutPlanner.from_graph(comp_graph)
+
+    created = {'uniforms': [], 'color_matches': [], 'outputs': [],
+               'map_outputs': []}
+    if map_outputs:
+        created['map_outputs'] = add_map_outputs(
+            comp_graph, col_map_nodes, planner
+        )
+
+    uniforms = None
+    shared = spread_mode not in (SPREAD_COMPACT, SPREAD_GRADIENT)
+    if shared and sd_colors:
+        first_pos = col_map_nodes[0].getPosition()
+        uniforms = create_uniforms(
+            comp_graph,
+            sd_colors,
+            planner.place_nodes(
+                (first_pos.x, first_pos.y), len(sd_colors),
+                max_rows=MAX_SPREAD_ROWS
+            )
+        )
+        created['uniforms'] = uniforms
+
+    for node, name in zip(col_map_nodes, source_names(col_map_nodes)):
+        source_created = build_spread(
+            comp_graph,
+            node,
+            sd_colors,
+            color_match_resource,
+            spread_mode,
+            planner,
+            uniforms,
+            f"{name}_",
+            gradient_resources
+        )
+        for key, nodes in source_created.items():
+            if key != 'uniforms' or uniforms is None:
+                created.setdefault(key, []).extend(nodes)
+
+    if compute:
+        comp_graph.compute()
+    return created
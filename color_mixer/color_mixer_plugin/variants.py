@@ -0,0 +1,179 @@
+"""Compact spreads, one color_match chain cycled through a whole palette.
+
+A regular spread builds a uniform, a color_match and an output for every
+color, so 200 colors mean 600 extra nodes to cook. A compact spread builds
+the chain once and stores the palette on the output node's description.
+The variants are rendered afterwards by ``export_variants``, which sets
+each color on the uniform node in turn and saves the cooked texture.
+"""
+import json
+from pathlib import Path
+
+from sd.api.sdproperty import SDPropertyCategory
+from sd.api.sdbasetypes import float2, ColorRGBA
+from sd.api.sdvaluecolorrgba import SDValueColorRGBA
+from sd.api.sdvaluestring import SDValueString
+
+from plugin_common.values import sd_bool, sd_int, sd_string
+
+
+COMPACT_OUTPUT_PREFIX = 'COL_VARIANT'
+
+
+def color_to_tuple(sd_color):
+    """SD color value (plain or spot color) -> (r, g, b, a) floats"""
+    col = sd_color.get()
+    return col.r, col.g, col.b, getattr(col, 'a', 1.0)
+
+
+def build_compact_spread(comp_graph, col_map_node, sd_colors,
+                         color_match_resource, positions, name_prefix=''):
+    """Build a single uniform -> color_match -> output chain for sd_colors
+
+    positions holds the uniform, color_match and output positions,
+    name_prefix is put in front of the output identifier. Returns the
+    created (uniform, color_match, output) nodes.
+    """
+    uniform_pos, match_pos, out_pos = positions
+
+    uniform_node = comp_graph.newNode('sbs::compositing::uniform')
+    uniform_node.setPosition(float2(*uniform_pos))
+    uniform_node.setInputPropertyValueFromId('outputcolor', sd_colors[0])
+
+    col_match = comp_graph.newInstanceNode(color_match_resource)
+    col_match.setPosition(float2(*match_pos))
+    col_match.setInputPropertyValueFromId(
+        "target_color_mode",
+        sd_int(1)
+    )
+    col_match.setInputPropertyValueFromId(
+        "use_mask",
+        sd_bool(False)
+    )
+
+    col_map_node.newPropertyConnectionFromId(
+        "unique_filter_output", col_match, "input"
+    )
+    uniform_node.newPropertyConnectionFromId(
+        "unique_filter_output", col_match, "input_target_color"
+    )
+
+    count_out = comp_graph.newNode('sbs::compositing::output')
+    count_out.setPosition(float2(*out_pos))
+    col_match.newPropertyConnectionFromId(
+        "output", count_out, "inputNodeOutput"
+    )
+
+    identifier = unique_identifier(
+        comp_graph, f"{name_prefix}{COMPACT_OUTPUT_PREFIX}"
+    )
+    count_out.setAnnotationPropertyValueFromId(
+        "identifier", sd_string(identifier)
+    )
+    count_out.setAnnotationPropertyValueFromId(
+        "description",
+        SDValueString.sNew(
+            json.dumps([color_to_tuple(col) for col in sd_colors])
+        )
+    )
+    return uniform_node, col_match, count_out
+
+
+def output_identifier(node):
+    """Identifier annotation of an output node, empty if unset"""
+    value = node.getAnnotationPropertyValueFromId('identifier')
+    return value.get() if value else ''
+
+
+def output_identifiers(comp_graph):
+    """Set of the identifiers of comp_graph's outputs"""
+    return {
+        output_identifier(node) for node in comp_graph.getOutputNodes()
+    }
+
+
+def unique_identifier(comp_graph, prefix, taken=None):
+    """prefix, or prefix_<n> if an output of comp_graph already has it
+
+    taken is a set from ``output_identifiers`` to check instead of reading
+    the outputs again, for spreads naming many outputs. The identifier
+    returned is added to it.
+    """
+    if taken is None:
+        taken = output_identifiers(comp_graph)
+    identifier = prefix
+    index = 2
+    while identifier in taken:
+        identifier = f"{prefix}_{index}"
+        index += 1
+    taken.add(identifier)
+    return identifier
+
+
+def _upstream_node(node, prop_id):
+    connections = node.getPropertyConnections(
+        node.getPropertyFromId(prop_id, SDPropertyCategory.Input)
+    )
+    return connections[0].getInputPropertyNode() if connections else None
+
+
+def find_compact_spreads(comp_graph):
+    """Return (output, color_match, uniform, palette) for every compact spread"""
+    spreads = []
+    for out_node in comp_graph.getOutputNodes():
+        identifier = output_identifier(out_node)
+        # <source>_COL_VARIANT of multi-source spreads too
+        if COMPACT_OUTPUT_PREFIX not in identifier:
+            continue
+
+        col_match = _upstream_node(out_node, 'inputNodeOutput')
+        uniform_node = col_match and _upstream_node(
+            col_match, 'input_target_color'
+        )
+        if not uniform_node:
+            print(f"Skipping broken compact spread {identifier}")
+            continue
+
+        palette = json.loads(
+            out_node.getAnnotationPropertyValueFromId('description').get()
+        )
+        spreads.append((out_node, col_match, uniform_node, palette))
+    return spreads
+
+
+def export_variants(comp_graph, directory, file_format='png'):
+    """Render every color of every compact spread to directory
+
+    Files are named ``<identifier>_<n>.<file_format>``, the first color is
+    set back on the uniform node afterwards. Returns the written paths.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = []
+
+    for out_node, col_match, uniform_node, palette in \
+            find_compact_spreads(comp_graph):
+        identifier = output_identifier(out_node)
+        output_prop = col_match.getPropertyFromId(
+            'output', SDPropertyCategory.Output
+        )
+
+        for i, rgba in enumerate(palette):
+            uniform_node.setInputPropertyValueFromId(
+                'outputcolor', SDValueColorRGBA.sNew(ColorRGBA(*rgba))
+            )
+            comp_graph.compute()
+
+            file_path = directory.joinpath(
+                f"{identifier}_{i + 1}.{file_format}"
+            )
+            col_match.getPropertyValue(output_prop).get().save(
+                file_path.as_posix()
+            )
+            written.append(file_path)
+
+        uniform_node.setInputPropertyValueFromId(
+            'outputcolor', SDValueColorRGBA.sNew(ColorRGBA(*palette[0]))
+        )
+    comp_graph.compute()
+    return written
@@ -7,6 +7,10 @@ import json
 from zipfile import ZipFile
 
 
+# Packages from the repository root bundled next to the plugin package
+SHARED_PACKAGES = ['plugin_common']
+
+
 class IgnoreFileFilter(object):
     def __init__(self, filename):
         self.__globs = []
@@ -122,6 +126,14 @@ def main():
                 elif file_filter.filter(filepath):
                     add_file_to_package(zfile, plugin_name, filepath)
 
+            # Shared packages live one level up, switch there so the
+            # archive paths stay relative to the package name
+            os.chdir(package_parent_dir)
+            for shared_package in SHARED_PACKAGES:
+                for filepath in walk(shared_package):
+                    if file_filter.filter(filepath):
+                        add_file_to_package(zfile, plugin_name, filepath)
+
     except Exception as e:
         print("Error while packaging plugin: %s" % e)
         sys.exit(1)
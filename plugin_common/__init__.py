@@ -0,0 +1,12 @@
+"""Code shared by the Substance Designer plugins in this repository.
+
+Each plugin's ``makepackage.py`` bundles this package next to the plugin
+package inside the ``.sdplugin`` archive, so ``import plugin_common`` works
+from any installed plugin. Python only imports the package once per
+Designer session, which is what lets the plugins share a single toolbar
+registry, icon cache and so on.
+
+Modules that talk to Designer import ``sd`` and ``PySide2`` themselves;
+nothing is imported eagerly here so the pure Python helpers stay usable
+outside of Designer.
+"""
@@ -0,0 +1,176 @@
+"""What a tool run changed in a graph, as a JSON friendly report.
+
+Snapshot a graph before and after a run and diff the two::
+
+    before = graphdiff.snapshot(graph)
+    prep_graph(graph, sd_application)
+    report = graphdiff.diff(before, graphdiff.snapshot(graph))
+
+A snapshot keeps one tuple per node and one per connection. Every node
+gets a signature hash of its definition and annotations, so unchanged
+nodes are compared with a single integer test. ``write_report`` saves the
+diffs of a whole batch with a summary on top, reviewing a batch means
+reading that summary instead of opening every graph.
+"""
+import json
+from collections import namedtuple
+
+from sd.api.sdproperty import SDPropertyCategory
+
+
+# Annotations worth reviewing, the rest are usages and similar structs
+NODE_ANNOTATIONS = ('identifier', 'label', 'description', 'group')
+GRAPH_ANNOTATIONS = ('physical_size',)
+
+# annotations is a tuple of (id, value) pairs
+NodeState = namedtuple(
+    'NodeState', ['definition', 'position', 'annotations', 'signature']
+)
+GraphSnapshot = namedtuple(
+    'GraphSnapshot', ['name', 'annotations', 'nodes', 'connections']
+)
+
+
+def plain_value(value):
+    """SD value -> something json can write, None stays None"""
+    if value is None:
+        return None
+    value = value.get() if hasattr(value, 'get') else value
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    fields = [f for f in ('x', 'y', 'z', 'w') if hasattr(value, f)]
+    if fields:
+        return tuple(getattr(value, f) for f in fields)
+    return str(value)
+
+
+def _annotations(node, ids):
+    values = []
+    for prop_id in ids:
+        value = plain_value(node.getPropertyValueFromId(
+            prop_id, SDPropertyCategory.Annotation
+        ))
+        if value is not None:
+            values.append((prop_id, value))
+    return tuple(values)
+
+
+def snapshot(graph):
+    """GraphSnapshot of graph's nodes, connections and annotations"""
+    nodes = {}
+    connections = set()
+    for node in graph.getNodes():
+        identifier = node.getIdentifier()
+        definition = node.getDefinition().getId()
+        annotations = _annotations(node, NODE_ANNOTATIONS)
+        position = node.getPosition()
+        nodes[identifier] = NodeState(
+            definition,
+            (position.x, position.y),
+            annotations,
+            hash((definition, annotations))
+        )
+
+        # Input side only, every connection is seen exactly once
+        for prop in node.getProperties(SDPropertyCategory.Input):
+            for connection in node.getPropertyConnections(prop):
+                connections.add((
+                    connection.getInputPropertyNode().getIdentifier(),
+                    connection.getInputProperty().getId(),
+                    identifier,
+                    prop.getId()
+                ))
+
+    graph_annotations = tuple(
+        (prop_id, plain_value(graph.getPropertyValue(
+            graph.getPropertyFromId(prop_id, SDPropertyCategory.Annotation)
+        )))
+        for prop_id in GRAPH_ANNOTATIONS
+    )
+    return GraphSnapshot(
+        graph.getIdentifier(), graph_annotations, nodes, frozenset(connections)
+    )
+
+
+def _node_entry(identifier, state):
+    return {
+        'id': identifier,
+        'definition': state.definition,
+        'annotations': dict(state.annotations),
+    }
+
+
+def diff(before, after):
+    """Differences between two snapshots of the same graph"""
+    before_ids = before.nodes.keys()
+    after_ids = after.nodes.keys()
+
+    changed = []
+    moved = []
+    for identifier in before_ids & after_ids:
+        old = before.nodes[identifier]
+        new = after.nodes[identifier]
+        if old.signature != new.signature:
+            old_values = dict(old.annotations)
+            new_values = dict(new.annotations)
+            changed.append({
+                'id': identifier,
+                'definition': new.definition,
+                'annotations': {
+                    key: [old_values.get(key), new_values.get(key)]
+                    for key in old_values.keys() | new_values.keys()
+                    if old_values.get(key) != new_values.get(key)
+                },
+            })
+        elif old.position != new.position:
+            moved.append(identifier)
+
+    return {
+        'graph': after.name,
+        'annotations': {
+            key: [old, new]
+            for (key, old), (_, new) in zip(before.annotations,
+                                            after.annotations)
+            if old != new
+        },
+        'added': [_node_entry(i, after.nodes[i])
+                  for i in sorted(after_ids - before_ids)],
+        'removed': [_node_entry(i, before.nodes[i])
+                    for i in sorted(before_ids - after_ids)],
+        'changed': sorted(changed, key=lambda entry: entry['id']),
+        'moved': sorted(moved),
+        'connected': sorted(after.connections - before.connections),
+        'disconnected': sorted(before.connections - after.connections),
+    }
+
+
+def is_empty(graph_diff):
+    return not any(
+        value for key, value in graph_diff.items() if key != 'graph'
+    )
+
+
+def summarize(diffs):
+    """Counts per change kind over many graph diffs"""
+    kinds = ('added', 'removed', 'changed', 'moved', 'connected',
+             'disconnected')
+    summary = {kind: sum(len(d[kind]) for d in diffs) for kind in kinds}
+    summary['graphs'] = len(diffs)
+    summary['unchanged'] = sum(1 for d in diffs if is_empty(d))
+    # Definitions added most often, usually what a tool run is about
+    added = {}
+    for d in diffs:
+        for entry in d['added']:
+            added[entry['definition']] = added.get(entry['definition'], 0) + 1
+    summary['added_by_definition'] = dict(
+        sorted(added.items(), key=lambda item: -item[1])
+    )
+    return summary
+
+
+def write_report(diffs, path):
+    """Save the diffs with their summary as JSON, returns the summary"""
+    summary = summarize(diffs)
+    with open(path, 'w') as f:
+        json.dump({'summary': summary, 'graphs': diffs}, f, indent=1)
+    return summary
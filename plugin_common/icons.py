@@ -0,0 +1,58 @@
+"""Process wide icon cache for the plugin toolbars.
+
+Icons are decoded from disk once per Designer session and the resulting
+pixmap is shared by every QIcon handed out afterwards.
+"""
+import logging
+from pathlib import Path
+
+from PySide2.QtGui import QIcon, QPixmap
+
+
+logger = logging.getLogger(__name__)
+
+# Resolved icon path -> decoded pixmap
+_pixmaps = {}
+
+_stats = {'hits': 0, 'misses': 0}
+
+
+def icon_path(module_file, file_name):
+    """Build the path of an icon shipped in a plugin's ``icons`` folder
+
+    Paths are joined part by part so they resolve on every platform,
+    usage from a plugin package: ``icon_path(__file__, 'my_icon.png')``
+    """
+    return Path(module_file).resolve().parent.joinpath('icons', file_name)
+
+
+def get_pixmap(path):
+    """Return the cached pixmap for path, decoding it on first request"""
+    key = Path(path).resolve().as_posix()
+    pixmap = _pixmaps.get(key)
+    if pixmap is not None:
+        _stats['hits'] += 1
+        return pixmap
+
+    _stats['misses'] += 1
+    pixmap = QPixmap(key)
+    if pixmap.isNull():
+        logger.warning("Failed to load icon: %s", key)
+    _pixmaps[key] = pixmap
+    return pixmap
+
+
+def get_icon(path):
+    """Return a QIcon backed by the shared pixmap for path"""
+    return QIcon(get_pixmap(path))
+
+
+def cache_stats():
+    """Hit/miss counters and number of decoded icons"""
+    return dict(_stats, size=len(_pixmaps))
+
+
+def clear_cache():
+    _pixmaps.clear()
+    _stats['hits'] = 0
+    _stats['misses'] = 0
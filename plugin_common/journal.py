@@ -0,0 +1,268 @@
+"""Journaled graph edits that can be rolled back.
+
+The plugins edit graphs in several stages, a failure in a late stage used
+to leave the graph half edited. Edits made through a ``GraphJournal`` are
+recorded and ``rollback`` undoes them newest first::
+
+    journal = GraphJournal(comp_graph)
+    try:
+        node = journal.new_node('sbs::compositing::output')
+        journal.connect(source, 'unique_filter_output', node,
+                        'inputNodeOutput')
+    except Exception:
+        journal.rollback()
+        raise
+
+Deleted nodes are snapshotted first, their definition, position, input
+values, annotations and connections, and recreated on rollback. Nodes
+are tracked by identifier since a recreated node gets a new one.
+"""
+from sd.api.sdproperty import SDPropertyCategory
+
+
+ATOMIC_PREFIX = 'sbs::compositing::'
+
+
+class RollbackError(RuntimeError):
+    """An undo failed, the graph is only partly restored"""
+
+
+class NodeSnapshot(object):
+    """Everything needed to recreate a deleted node"""
+    __slots__ = ('identifier', 'definition_id', 'resource', 'position',
+                 'inputs', 'annotations', 'upstream', 'downstream')
+
+    def __init__(self, node):
+        definition_id = node.getDefinition().getId()
+        self.identifier = node.getIdentifier()
+        self.definition_id = definition_id
+        self.resource = None if definition_id.startswith(ATOMIC_PREFIX) \
+            else node.getReferencedResource()
+        self.position = node.getPosition()
+        self.inputs = []
+        self.annotations = []
+        # (node, its identifier, its property id, own property id)
+        self.upstream = []
+        self.downstream = []
+
+        for prop in node.getProperties(SDPropertyCategory.Input):
+            connections = node.getPropertyConnections(prop)
+            for connection in connections:
+                source = connection.getInputPropertyNode()
+                self.upstream.append((
+                    source,
+                    source.getIdentifier(),
+                    connection.getInputProperty().getId(),
+                    prop.getId()
+                ))
+            value = node.getPropertyValue(prop)
+            if not connections and value is not None:
+                self.inputs.append((prop.getId(), value))
+
+        for prop in node.getProperties(SDPropertyCategory.Annotation):
+            value = node.getPropertyValue(prop)
+            if value is not None:
+                self.annotations.append((prop.getId(), value))
+
+        for prop in node.getProperties(SDPropertyCategory.Output):
+            for connection in node.getPropertyConnections(prop):
+                target = connection.getInputPropertyNode()
+                self.downstream.append((
+                    target,
+                    target.getIdentifier(),
+                    connection.getInputProperty().getId(),
+                    prop.getId()
+                ))
+
+
+class GraphJournal(object):
+    """Records graph edits so they can be undone"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._entries = []
+        # Old identifier -> node recreated by rollback
+        self._restored = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def new_node(self, definition_id):
+        node = self.graph.newNode(definition_id)
+        self._entries.append(('create', node.getIdentifier(), node))
+        return node
+
+    def new_instance_node(self, resource):
+        node = self.graph.newInstanceNode(resource)
+        self._entries.append(('create', node.getIdentifier(), node))
+        return node
+
+    def delete_node(self, node):
+        snapshot = NodeSnapshot(node)
+        self.graph.deleteNode(node)
+        self._entries.append(('delete', snapshot.identifier, snapshot))
+
+    def connect(self, source, source_prop_id, target, target_prop_id):
+        """Connect by property ids, see ``connect_properties``"""
+        return self.connect_properties(
+            source,
+            source.getPropertyFromId(
+                source_prop_id, SDPropertyCategory.Output
+            ),
+            target,
+            target.getPropertyFromId(
+                target_prop_id, SDPropertyCategory.Input
+            )
+        )
+
+    def connect_properties(self, source, source_prop, target, target_prop):
+        """Connect source_prop to target_prop, keeping the replaced link"""
+        previous = []
+        for connection in target.getPropertyConnections(target_prop):
+            node = connection.getInputPropertyNode()
+            previous.append((
+                node,
+                node.getIdentifier(),
+                connection.getInputProperty().getId()
+            ))
+        connection = source.newPropertyConnection(
+            source_prop, target, target_prop
+        )
+        self._entries.append((
+            'connect', target.getIdentifier(),
+            (target, target_prop.getId(), previous)
+        ))
+        return connection
+
+    def disconnect(self, node, prop_id):
+        """Remove the connections into the input prop_id of node"""
+        prop = node.getPropertyFromId(prop_id, SDPropertyCategory.Input)
+        previous = []
+        for connection in node.getPropertyConnections(prop):
+            source = connection.getInputPropertyNode()
+            previous.append((
+                source,
+                source.getIdentifier(),
+                connection.getInputProperty().getId()
+            ))
+        node.deletePropertyConnections(prop)
+        # Undone like a connect, the previous links come back
+        self._entries.append((
+            'connect', node.getIdentifier(), (node, prop_id, previous)
+        ))
+
+    def set_input(self, node, prop_id, value):
+        self._set_value(node, prop_id, value, SDPropertyCategory.Input)
+
+    def set_annotation(self, node, prop_id, value):
+        self._set_value(node, prop_id, value, SDPropertyCategory.Annotation)
+
+    def _set_value(self, node, prop_id, value, category):
+        previous = node.getPropertyValueFromId(prop_id, category)
+        if category == SDPropertyCategory.Annotation:
+            node.setAnnotationPropertyValueFromId(prop_id, value)
+        else:
+            node.setInputPropertyValueFromId(prop_id, value)
+        self._entries.append((
+            'value', node.getIdentifier(),
+            (node, prop_id, category, previous)
+        ))
+
+    def set_position(self, node, position):
+        previous = node.getPosition()
+        node.setPosition(position)
+        self._entries.append((
+            'position', node.getIdentifier(), (node, previous)
+        ))
+
+    def set_graph_property(self, prop, value):
+        previous = self.graph.getPropertyValue(prop)
+        self.graph.setPropertyValue(prop, value)
+        self._entries.append(('graph', None, (prop, previous)))
+
+    def rollback(self):
+        """Undo every recorded edit, newest first
+
+        Returns the number of edits undone, the journal is empty after.
+        Raises ``RollbackError`` if an undo fails, the older edits are
+        then left in place.
+        """
+        undone = 0
+        while self._entries:
+            kind, identifier, data = self._entries.pop()
+            try:
+                getattr(self, f'_undo_{kind}')(identifier, data)
+            except Exception as error:
+                raise RollbackError(
+                    f"Rollback stopped after {undone} edits, undoing a "
+                    f"{kind} failed: {error}"
+                ) from error
+            undone += 1
+        self._restored.clear()
+        return undone
+
+    def commit(self):
+        """Keep every edit, nothing can be rolled back afterwards"""
+        self._entries.clear()
+
+    def _resolve(self, identifier, node):
+        """node, or its replacement if rollback recreated it"""
+        return self._restored.get(identifier, node)
+
+    def _undo_create(self, identifier, node):
+        self.graph.deleteNode(self._resolve(identifier, node))
+
+    def _undo_delete(self, identifier, snapshot):
+        if snapshot.resource is not None:
+            node = self.graph.newInstanceNode(snapshot.resource)
+        else:
+            node = self.graph.newNode(snapshot.definition_id)
+        self._restored[identifier] = node
+
+        node.setPosition(snapshot.position)
+        for prop_id, value in snapshot.inputs:
+            node.setInputPropertyValueFromId(prop_id, value)
+        for prop_id, value in snapshot.annotations:
+            node.setAnnotationPropertyValueFromId(prop_id, value)
+
+        # Neighbours deleted later in the run were recreated already
+        for source, source_id, source_prop_id, prop_id in snapshot.upstream:
+            self._resolve(source_id, source).newPropertyConnectionFromId(
+                source_prop_id, node, prop_id
+            )
+        for target, target_id, target_prop_id, prop_id in \
+                snapshot.downstream:
+            target = self._resolve(target_id, target)
+            # The target input may have been reconnected by the run
+            target.deletePropertyConnections(target.getPropertyFromId(
+                target_prop_id, SDPropertyCategory.Input
+            ))
+            node.newPropertyConnectionFromId(prop_id, target, target_prop_id)
+
+    def _undo_connect(self, identifier, data):
+        target, prop_id, previous = data
+        target = self._resolve(identifier, target)
+        prop = target.getPropertyFromId(prop_id, SDPropertyCategory.Input)
+        target.deletePropertyConnections(prop)
+        for source, source_id, source_prop_id in previous:
+            self._resolve(source_id, source).newPropertyConnectionFromId(
+                source_prop_id, target, prop_id
+            )
+
+    def _undo_value(self, identifier, data):
+        node, prop_id, category, previous = data
+        if previous is None:
+            return
+        node = self._resolve(identifier, node)
+        if category == SDPropertyCategory.Annotation:
+            node.setAnnotationPropertyValueFromId(prop_id, previous)
+        else:
+            node.setInputPropertyValueFromId(prop_id, previous)
+
+    def _undo_position(self, identifier, data):
+        node, previous = data
+        self._resolve(identifier, node).setPosition(previous)
+
+    def _undo_graph(self, identifier, data):
+        prop, previous = data
+        self.graph.setPropertyValue(prop, previous)
@@ -0,0 +1,157 @@
+"""Batch placement of generated nodes.
+
+The plugins used to place new nodes on a fixed grid around the source
+node, which overlaps existing nodes as soon as a spread gets large. The
+planner here places a whole batch at once:
+
+* existing node bounding boxes go into a grid hash, so overlap checks
+  only look at the few cells a block covers
+* new nodes are placed as rows of chained nodes (e.g. uniform ->
+  color_match -> output), wrapped into several columns when requested
+* a block that hits existing nodes is pushed right one step at a time,
+  placed blocks are reserved so the next ones avoid them as well
+
+Positions are plain ``(x, y)`` tuples, wrap them in ``float2`` to set
+them on nodes. Nothing here imports ``sd``.
+"""
+from math import ceil, floor, sqrt
+
+
+# Matches the 200 unit grid the plugins always used
+DEFAULT_NODE_SIZE = 128
+DEFAULT_SPACING = 72
+
+
+class SpatialIndex(object):
+    """Uniform grid hash of axis aligned boxes ``(x0, y0, x1, y1)``"""
+
+    def __init__(self, cell_size=800):
+        self.cell_size = float(cell_size)
+        self._boxes = []
+        self._cells = {}
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def _cell_range(self, box):
+        size = self.cell_size
+        return (
+            range(int(floor(box[0] / size)), int(floor(box[2] / size)) + 1),
+            range(int(floor(box[1] / size)), int(floor(box[3] / size)) + 1),
+        )
+
+    def insert(self, box):
+        box_id = len(self._boxes)
+        self._boxes.append(box)
+        x_cells, y_cells = self._cell_range(box)
+        for cx in x_cells:
+            for cy in y_cells:
+                self._cells.setdefault((cx, cy), []).append(box_id)
+        return box_id
+
+    def query(self, box):
+        """Return the boxes overlapping box"""
+        found = set()
+        x_cells, y_cells = self._cell_range(box)
+        for cx in x_cells:
+            for cy in y_cells:
+                for box_id in self._cells.get((cx, cy), ()):
+                    if box_id not in found and _overlaps(
+                            self._boxes[box_id], box):
+                        found.add(box_id)
+        return [self._boxes[box_id] for box_id in sorted(found)]
+
+    def intersects(self, box):
+        x_cells, y_cells = self._cell_range(box)
+        for cx in x_cells:
+            for cy in y_cells:
+                for box_id in self._cells.get((cx, cy), ()):
+                    if _overlaps(self._boxes[box_id], box):
+                        return True
+        return False
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class LayoutPlanner(object):
+    """Compute non overlapping positions for batches of new nodes"""
+
+    def __init__(self, positions=(), node_size=DEFAULT_NODE_SIZE,
+                 spacing=DEFAULT_SPACING):
+        self.node_size = node_size
+        self.spacing = spacing
+        self.step = node_size + spacing
+        self.index = SpatialIndex(cell_size=self.step * 4)
+
+        for x, y in positions:
+            self.reserve_node(x, y)
+
+    @classmethod
+    def from_graph(cls, graph, **kwargs):
+        """Build a planner from the node positions of an SD graph"""
+        positions = []
+        for node in graph.getNodes():
+            pos = node.getPosition()
+            positions.append((pos.x, pos.y))
+        return cls(positions, **kwargs)
+
+    def node_box(self, x, y):
+        half = self.node_size / 2
+        return x - half, y - half, x + half, y + half
+
+    def reserve_node(self, x, y):
+        """Mark a node position as occupied"""
+        self.index.insert(self.node_box(x, y))
+
+    def _free_x(self, x, top_y, width, height):
+        """Push a block right until it no longer hits anything"""
+        half = self.node_size / 2
+        while True:
+            box = (x - half, top_y - half,
+                   x - half + width, top_y - half + height)
+            if not self.index.intersects(box):
+                return x, box
+            x += self.step
+
+    def place_chains(self, anchor, count, chain_length=1, max_rows=None,
+                     compact=False, x_offset=None):
+        """Place count rows of chain_length nodes to the right of anchor
+
+        Rows are centred vertically on the anchor. With max_rows the rows
+        wrap into extra columns, compact picks max_rows so the whole batch
+        comes out roughly square.
+        Returns a list with one list of ``(x, y)`` per row.
+        """
+        if count <= 0:
+            return []
+
+        step = self.step
+        if compact:
+            max_rows = max(1, int(ceil(sqrt(count * chain_length))))
+        rows_per_column = min(count, max_rows or count)
+        column_count = int(ceil(count / rows_per_column))
+
+        top_y = anchor[1] - (rows_per_column * step / 2)
+        x = anchor[0] + (step * 2 if x_offset is None else x_offset)
+        block_width = chain_length * step
+
+        rows = []
+        for column in range(column_count):
+            start = column * rows_per_column
+            row_count = min(rows_per_column, count - start)
+
+            x, box = self._free_x(x, top_y, block_width, row_count * step)
+            self.index.insert(box)
+
+            for row in range(row_count):
+                y = top_y + step * row
+                rows.append([(x + step * i, y) for i in range(chain_length)])
+
+            x += block_width + step
+        return rows
+
+    def place_nodes(self, anchor, count, **kwargs):
+        """Place count single nodes, shortcut for chains of one node"""
+        return [row[0] for row in self.place_chains(anchor, count, **kwargs)]
@@ -0,0 +1,294 @@
+"""Output naming conventions, one table for every plugin.
+
+``naming.json`` maps the names exports arrive with to canonical map
+names, and every client to the names it wants for those::
+
+    "aliases": {"BASE": ["Base Color", "basecolor"], ...}
+    "clients": {"unreal": {"outputs": {"BASE": "BaseColor"},
+                           "variant": "BaseColor_{index:02d}"}}
+
+A client leaving a map out keeps the canonical name. ``variant`` names
+the color variants color_mixer builds from ``{index}``, counted from 1.
+Tables compile into a single dict keyed by the name without case, spaces
+or underscores, so a remap is one lookup whatever the spelling.
+``FABRIC_NAMING`` points to another table file and
+``FABRIC_NAMING_CLIENT`` picks the client, ``default`` if unset.
+
+``apply`` renames the outputs of an open graph, ``rename_sbs`` does the
+same to .sbs files without Designer::
+
+    python -m plugin_common.naming exports/*.sbs --client unreal -o out/
+
+Instances refer to the outputs of their graph by identifier, so
+``rename_sbs`` leaves library outputs alone: packages from Designer's
+library and graphs instanced by another graph of their package.
+``--libraries`` renames those too.
+"""
+import argparse
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+
+
+NAMING_FILE = Path(os.environ.get(
+    'FABRIC_NAMING',
+    Path(__file__).parent.joinpath('naming.json')
+))
+CLIENT_ENV = 'FABRIC_NAMING_CLIENT'
+DEFAULT_CLIENT = 'default'
+DEFAULT_VARIANT = 'COL_{index}'
+# Same check as packages.user_package_graphs
+LIBRARY_PATH = 'Allegorithmic/Substance'
+
+
+class NamingError(ValueError):
+    pass
+
+
+def name_key(name):
+    """Lookup key of a name, 'Base Color' and 'base_color' match"""
+    return ''.join(c for c in name.lower() if c.isalnum())
+
+
+class Convention(object):
+    """Compiled naming table of one client"""
+
+    def __init__(self, client, names, variant=DEFAULT_VARIANT):
+        # names is {any spelling: client name}
+        self.client = client
+        self.variant = variant
+        self._lookup = {name_key(k): v for k, v in names.items()}
+
+    @classmethod
+    def from_table(cls, table, client=DEFAULT_CLIENT):
+        clients = table.get('clients', {})
+        if client not in clients:
+            raise NamingError(f"No naming convention for client {client!r}")
+        settings = clients[client]
+        outputs = settings.get('outputs', {})
+
+        # Only the canonical names and their aliases are remapped, a
+        # client name that is no alias, such as Height, is left alone
+        names = {}
+        for canonical, aliases in table.get('aliases', {}).items():
+            name = outputs.get(canonical, canonical)
+            for alias in aliases:
+                names[alias] = name
+            names[canonical] = name
+        return cls(
+            client, names, settings.get('variant', DEFAULT_VARIANT)
+        )
+
+    def remap(self, name):
+        """Client name for name, None if the table doesn't know it"""
+        if not name:
+            return None
+        return self._lookup.get(name_key(name))
+
+    def output_name(self, name):
+        """Client name for name, name itself in upper case if unknown"""
+        return self.remap(name) or name.upper()
+
+    def variant_name(self, index, prefix=''):
+        """Name of the index-th color variant, counted from 1"""
+        return prefix + self.variant.format(index=index)
+
+
+def load_table(path=NAMING_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+_conventions = {}
+
+
+def default_convention(client=None):
+    """Convention of FABRIC_NAMING_CLIENT, table read again on change"""
+    client = client or os.environ.get(CLIENT_ENV) or DEFAULT_CLIENT
+    key = (NAMING_FILE, os.stat(NAMING_FILE).st_mtime, client)
+    if key not in _conventions:
+        _conventions.clear()
+        _conventions[key] = Convention.from_table(load_table(), client)
+    return _conventions[key]
+
+
+def _unique(name, taken):
+    unique = name
+    index = 2
+    while unique in taken:
+        unique = f"{name}_{index}"
+        index += 1
+    return unique
+
+
+def plan(outputs, convention, overrides=None):
+    """New name of every output, {key: new name}
+
+    outputs is a list of (key, identifier, label, definition label),
+    overrides {key: name} wins over the table. Outputs already carrying
+    their name keep it, the others get a suffix when names collide.
+    """
+    overrides = overrides or {}
+    wanted = {}
+    for key, identifier, label, definition_label in outputs:
+        name = overrides.get(key) or convention.remap(identifier) or \
+            convention.remap(label) or convention.remap(definition_label)
+        if name:
+            wanted[key] = name
+
+    taken = {
+        identifier for key, identifier, _, _ in outputs
+        if key not in wanted or wanted[key] == identifier
+    }
+    names = {}
+    for key, identifier, _, _ in outputs:
+        if key not in wanted:
+            continue
+        name = wanted[key]
+        if name != identifier:
+            name = _unique(name, taken)
+            taken.add(name)
+        names[key] = name
+    return names
+
+
+def _annotation(node, prop_id):
+    value = node.getAnnotationPropertyValueFromId(prop_id)
+    return value.get() if value else ''
+
+
+def apply(comp_graph, convention=None, journal=None, overrides=None):
+    """Rename the outputs of comp_graph, returns {old: new identifier}
+
+    Sets the identifier and label annotations, through journal when one
+    is given. overrides is {node identifier: name}.
+    """
+    # Imported here, the .sbs functions below run without Designer
+    from plugin_common.values import sd_string
+
+    convention = convention or default_convention()
+    nodes = {}
+    outputs = []
+    for node in comp_graph.getOutputNodes():
+        key = node.getIdentifier()
+        nodes[key] = node
+        outputs.append((
+            key,
+            _annotation(node, 'identifier'),
+            _annotation(node, 'label'),
+            node.getDefinition().getLabel(),
+        ))
+
+    renamed = {}
+    names = plan(outputs, convention, overrides)
+    for key, identifier, label, _ in outputs:
+        name = names.get(key)
+        if name is None:
+            continue
+        node = nodes[key]
+        for prop_id, current in (('identifier', identifier),
+                                 ('label', label)):
+            if current == name:
+                continue
+            if journal is not None:
+                journal.set_annotation(node, prop_id, sd_string(name))
+            else:
+                node.setAnnotationPropertyValueFromId(
+                    prop_id, sd_string(name)
+                )
+        if identifier != name:
+            renamed[identifier] = name
+    return renamed
+
+
+def _child_value(element, path):
+    child = element.find(path)
+    return child.get('v', '') if child is not None else ''
+
+
+def _instanced(root):
+    """Identifiers of the graphs instanced inside their own package"""
+    instanced = set()
+    for path in root.iter('path'):
+        url = path.get('v', '')
+        # pkg:///graph is this package, pkg:///graph?dependency=... another
+        if url.startswith('pkg:///') and '?dependency=' not in url:
+            instanced.add(url[len('pkg:///'):].split('?')[0])
+    return instanced
+
+
+def rename_sbs(path, convention=None, target=None, libraries=False):
+    """Rename the graph outputs of an .sbs file, no Designer needed
+
+    Library outputs, see the module docstring, are only renamed with
+    libraries. Writes to target, or over path, only when something
+    changed. Returns {graph identifier: {old: new identifier}}.
+    """
+    convention = convention or default_convention()
+    tree = ElementTree.parse(path)
+    report = {}
+    library = LIBRARY_PATH in Path(path).resolve().as_posix()
+    instanced = _instanced(tree.getroot())
+    for graph in tree.getroot().iter('graph'):
+        if not libraries and (
+                library or _child_value(graph, 'identifier') in instanced):
+            continue
+        elements = graph.findall('graphOutputs/graphoutput')
+        # Output nodes point at their graphoutput by uid, renaming the
+        # graphoutput renames the node too
+        outputs = [
+            (
+                index,
+                _child_value(element, 'identifier'),
+                _child_value(element, 'attributes/label'),
+                '',
+            )
+            for index, element in enumerate(elements)
+        ]
+        renamed = {}
+        for index, name in plan(outputs, convention).items():
+            element = elements[index]
+            identifier = element.find('identifier')
+            if identifier is None:
+                continue
+            if identifier.get('v') != name:
+                renamed[identifier.get('v')] = name
+                identifier.set('v', name)
+            label = element.find('attributes/label')
+            if label is not None:
+                label.set('v', name)
+        if renamed:
+            report[_child_value(graph, 'identifier')] = renamed
+
+    if report or (target and Path(target) != Path(path)):
+        tree.write(target or path, encoding='UTF-8', xml_declaration=True)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('sources', nargs='+', help=".sbs files")
+    parser.add_argument('--client', help="Naming convention to apply")
+    parser.add_argument('-o', '--out',
+                        help="Output folder, files are edited in place "
+                             "without one")
+    parser.add_argument('--libraries', action='store_true',
+                        help="Also rename library outputs, breaks the "
+                             "instances using them")
+    args = parser.parse_args(argv)
+
+    convention = default_convention(args.client)
+    if args.out:
+        Path(args.out).mkdir(parents=True, exist_ok=True)
+    for source in map(Path, args.sources):
+        target = Path(args.out, source.name) if args.out else None
+        report = rename_sbs(source, convention, target, args.libraries)
+        for graph, renamed in report.items():
+            changes = ', '.join(f"{old} -> {new}"
+                                for old, new in renamed.items())
+            print(f"{source.name} {graph}: {changes}")
+
+
+if __name__ == '__main__':
+    main()
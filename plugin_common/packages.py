@@ -0,0 +1,18 @@
+"""Package helpers shared by the batch runners."""
+from pathlib import Path
+
+import sd
+
+
+def user_package_graphs(package_manager=None):
+    """Graphs of the loaded user packages, skipping Designer's library"""
+    package_manager = package_manager or \
+        sd.getContext().getSDApplication().getPackageMgr()
+
+    for package in package_manager.getUserPackages():
+        file_path = package.getFilePath()
+        if 'Allegorithmic/Substance' in file_path:
+            continue
+        graph = package.findResourceFromUrl(Path(file_path).stem)
+        if graph:
+            yield graph
@@ -0,0 +1,183 @@
+"""Shared toolbar runtime for the plugins.
+
+Every plugin used to ship its own ``PluginToolBar`` and register its own
+graph view callback, which meant one toolbar widget per plugin per graph
+view. The runtime keeps a single registry instead:
+
+* one graph view created callback, registered while at least one plugin
+  action exists
+* one toolbar per graph view, filled the first time the view is shown
+* one ``QAction`` per plugin, shared by every toolbar
+
+Plugins only describe their action::
+
+    def initializeSDPlugin():
+        runtime.register_action(
+            'color_mixer', icon_path, "Tooltip", color_mixer
+        )
+
+    def uninitializeSDPlugin():
+        runtime.unregister_action('color_mixer')
+"""
+from functools import partial
+import weakref
+
+import sd
+from PySide2 import QtWidgets
+
+from plugin_common import icons
+
+
+class PluginAction(object):
+    """Description of a toolbar action, turned into a QAction on demand"""
+    __slots__ = ('name', 'icon_path', 'tooltip', 'callback', 'qaction')
+
+    def __init__(self, name, icon_path, tooltip, callback):
+        self.name = name
+        self.icon_path = icon_path
+        self.tooltip = tooltip
+        self.callback = callback
+        self.qaction = None
+
+    def get_qaction(self, parent):
+        """Create the shared QAction the first time a toolbar needs it"""
+        if self.qaction is None:
+            self.qaction = QtWidgets.QAction(
+                icons.get_icon(self.icon_path), self.name, parent
+            )
+            self.qaction.setToolTip(self.tooltip)
+            # triggered passes a 'checked' flag the callbacks don't expect
+            self.qaction.triggered.connect(lambda checked=False: self.callback())
+        return self.qaction
+
+    def release(self):
+        if self.qaction is not None:
+            self.qaction.deleteLater()
+            self.qaction = None
+
+
+class PluginToolBar(QtWidgets.QToolBar):
+    """Toolbar shared by all plugins for a single graph view"""
+
+    def __init__(self, graphViewID, uiMgr):
+        super(PluginToolBar, self).__init__(parent=uiMgr.getMainWindow())
+
+        self.setObjectName('custom_plugins_toolbar')
+
+        self.__graphViewID = graphViewID
+        self.__populated = False
+
+        self.destroyed.connect(
+            partial(_onToolbarDeleted, graphViewID=graphViewID)
+        )
+
+    def tooltip(self):
+        return self.tr("Custom Plugins")
+
+    def isPopulated(self):
+        return self.__populated
+
+    def populate(self):
+        """Add every registered action, done lazily on first show"""
+        for plugin_action in _actions.values():
+            self.addAction(plugin_action.get_qaction(self.parent()))
+        self.__populated = True
+
+    def showEvent(self, event):
+        if not self.__populated:
+            self.populate()
+        super(PluginToolBar, self).showEvent(event)
+
+
+# Registered actions keyed by name, in registration order
+_actions = {}
+
+# graphViewID -> weakref to that view's toolbar
+_toolbars = {}
+
+_graphViewCreatedCallbackID = None
+
+
+def _getUIMgr():
+    ctx = sd.getContext()
+    app = ctx.getSDApplication()
+    return app.getQtForPythonUIMgr()
+
+
+def _onToolbarDeleted(graphViewID):
+    _toolbars.pop(graphViewID, None)
+
+
+def _iterToolbars():
+    for toolbar_ref in list(_toolbars.values()):
+        toolbar = toolbar_ref()
+        if toolbar:
+            yield toolbar
+
+
+def onNewGraphViewCreated(graphViewID, uiMgr):
+    toolbar = PluginToolBar(graphViewID, uiMgr)
+    _toolbars[graphViewID] = weakref.ref(toolbar)
+    uiMgr.addToolbarToGraphView(
+        graphViewID,
+        toolbar,
+        tooltip=toolbar.tooltip())
+
+
+def register_action(name, icon_path, tooltip, callback):
+    """Add a plugin action to every graph view toolbar
+
+    The graph view callback is registered with the first action, toolbars
+    that were already shown receive the new action straight away.
+    """
+    global _graphViewCreatedCallbackID
+
+    uiMgr = _getUIMgr()
+    if not uiMgr:
+        return
+
+    plugin_action = PluginAction(name, icon_path, tooltip, callback)
+    _actions[name] = plugin_action
+
+    for toolbar in _iterToolbars():
+        if toolbar.isPopulated():
+            toolbar.addAction(plugin_action.get_qaction(toolbar.parent()))
+
+    if _graphViewCreatedCallbackID is None:
+        _graphViewCreatedCallbackID = uiMgr.registerGraphViewCreatedCallback(
+            partial(onNewGraphViewCreated, uiMgr=uiMgr))
+
+
+def unregister_action(name):
+    """Remove a plugin action, tearing everything down with the last one"""
+    global _graphViewCreatedCallbackID
+
+    plugin_action = _actions.pop(name, None)
+    if plugin_action is None:
+        return
+
+    if plugin_action.qaction is not None:
+        for toolbar in _iterToolbars():
+            toolbar.removeAction(plugin_action.qaction)
+    plugin_action.release()
+
+    if _actions:
+        return
+
+    uiMgr = _getUIMgr()
+    if uiMgr and _graphViewCreatedCallbackID is not None:
+        uiMgr.unregisterCallback(_graphViewCreatedCallbackID)
+    _graphViewCreatedCallbackID = None
+    removeAllToolbars()
+    icons.clear_cache()
+
+
+def removeAllToolbars():
+    for toolbar in _iterToolbars():
+        toolbar.deleteLater()
+
+
+def getMainWindow():
+    """Parent widget for plugin dialogs"""
+    uiMgr = _getUIMgr()
+    return uiMgr.getMainWindow() if uiMgr else None
@@ -0,0 +1,315 @@
+"""Read .sbs packages without Designer.
+
+A small model of the compositing graphs in a package, for tests and
+batch tools looking at what the plugins produce::
+
+    package = sbs.load('fabric.sbs')
+    graph = package.graphs[0]
+    for node in graph.nodes.values():
+        print(node.kind, node.definition, graph.upstream(node.uid))
+
+Nodes and connections are ``__slots__`` objects keyed by their uid.
+Parameter blocks, most of a package when they hold function graphs, are
+kept as their compact XML and only turned into values when a node's
+``parameters`` are read. ``parameters=False`` drops them for pure
+topology work. The file is read with ``iterparse`` and every node is
+cleared once converted, so thousands of packages can be walked with
+``iter_packages`` while only one is in memory.
+
+    python -m plugin_common.sbs exports/*.sbs
+"""
+import argparse
+from collections import Counter
+import xml.etree.ElementTree as ElementTree
+
+
+FILTER = 'filter'
+INSTANCE = 'instance'
+INPUT = 'input'
+OUTPUT = 'output'
+
+_IMPLEMENTATIONS = {
+    'compFilter': FILTER,
+    'compInstance': INSTANCE,
+    'compInputBridge': INPUT,
+    'compOutputBridge': OUTPUT,
+}
+
+
+def _value(element):
+    """constantValue* element -> Python value"""
+    tag = element.tag[len('constantValue'):]
+    text = element.get('v', '')
+    if tag == 'String':
+        return text
+    if tag == 'Bool':
+        return text not in ('0', 'false', '')
+    convert = float if tag.startswith('Float') else int
+    values = tuple(convert(part) for part in text.split())
+    return values[0] if len(values) == 1 else values
+
+
+def parse_parameters(element):
+    """{name: value} of a <parameters> element
+
+    Parameters driven by a function graph have the value None.
+    """
+    parameters = {}
+    for parameter in element.iterfind('parameter'):
+        value = None
+        param_value = parameter.find('paramValue')
+        if param_value is not None:
+            for child in param_value:
+                if child.tag.startswith('constantValue'):
+                    value = _value(child)
+        parameters[parameter.find('name').get('v')] = value
+    return parameters
+
+
+class Connection(object):
+    """source's output feeds the input of target"""
+    __slots__ = ('target', 'input', 'source', 'output')
+
+    def __init__(self, target, input, source, output):
+        self.target = target
+        self.input = input
+        self.source = source
+        # None for sources with a single output
+        self.output = output
+
+    def __repr__(self):
+        return (f"Connection({self.source}:{self.output} -> "
+                f"{self.target}:{self.input})")
+
+
+class Node(object):
+    """One compositing node
+
+    definition is the filter name for atomic nodes, the graph url for
+    instances and the graph input or output uid for bridges.
+    """
+    __slots__ = ('uid', 'kind', 'definition', 'position', 'outputs',
+                 '_parameters_xml', '_parameters')
+
+    def __init__(self, uid, kind, definition, position, outputs,
+                 parameters_xml=None):
+        self.uid = uid
+        self.kind = kind
+        self.definition = definition
+        self.position = position
+        self.outputs = outputs
+        self._parameters_xml = parameters_xml
+        self._parameters = None
+
+    @property
+    def parameters(self):
+        if self._parameters is None:
+            self._parameters = {} if self._parameters_xml is None else \
+                parse_parameters(ElementTree.fromstring(self._parameters_xml))
+            self._parameters_xml = None
+        return self._parameters
+
+    def __repr__(self):
+        return f"Node({self.uid}, {self.kind}, {self.definition!r})"
+
+
+class Graph(object):
+    """Nodes by uid plus connections indexed by target and source uid"""
+    __slots__ = ('identifier', 'uid', 'label', 'outputs', 'nodes',
+                 '_inputs', '_sources')
+
+    def __init__(self, identifier, uid, label=''):
+        self.identifier = identifier
+        self.uid = uid
+        self.label = label
+        # graph output uid -> (identifier, label)
+        self.outputs = {}
+        self.nodes = {}
+        # target uid -> tuple of Connection
+        self._inputs = {}
+        self._sources = None
+
+    def add_node(self, node, connections=()):
+        self.nodes[node.uid] = node
+        if connections:
+            self._inputs[node.uid] = tuple(connections)
+            self._sources = None
+
+    def inputs(self, uid):
+        """Connections into the node uid"""
+        return self._inputs.get(uid, ())
+
+    def downstream(self, uid):
+        """Connections out of the node uid"""
+        if self._sources is None:
+            # Built on first use, most reads only go upstream
+            self._sources = {}
+            for connections in self._inputs.values():
+                for connection in connections:
+                    self._sources.setdefault(
+                        connection.source, []
+                    ).append(connection)
+        return self._sources.get(uid, ())
+
+    def upstream(self, uid):
+        """Nodes feeding the node uid"""
+        return [self.nodes[c.source] for c in self.inputs(uid)
+                if c.source in self.nodes]
+
+    def connections(self):
+        for connections in self._inputs.values():
+            yield from connections
+
+    def output_nodes(self):
+        """{output identifier: node} of the output bridges"""
+        return {
+            self.outputs[node.definition][0]: node
+            for node in self.nodes.values()
+            if node.kind == OUTPUT and node.definition in self.outputs
+        }
+
+    def definitions(self):
+        """Counter of node definitions, instances by graph url"""
+        return Counter(node.definition for node in self.nodes.values()
+                       if node.kind in (FILTER, INSTANCE))
+
+    def __repr__(self):
+        return f"Graph({self.identifier!r}, {len(self.nodes)} nodes)"
+
+
+class Package(object):
+    __slots__ = ('path', 'dependencies', 'graphs')
+
+    def __init__(self, path):
+        self.path = path
+        # dependency uid -> file name, e.g. sbs://auto_levels.sbs
+        self.dependencies = {}
+        self.graphs = []
+
+    def graph(self, identifier):
+        return next(
+            (g for g in self.graphs if g.identifier == identifier), None
+        )
+
+    def __repr__(self):
+        return f"Package({str(self.path)!r}, {len(self.graphs)} graphs)"
+
+
+def _v(element, path, default=''):
+    child = element.find(path)
+    return child.get('v', default) if child is not None else default
+
+
+def _uid(text):
+    return int(text) if text else None
+
+
+def _node(element, keep_parameters):
+    implementation = element.find('compImplementation')
+    child = implementation[0]
+    kind = _IMPLEMENTATIONS.get(child.tag, child.tag)
+    if kind == FILTER:
+        definition = _v(child, 'filter')
+    elif kind == INSTANCE:
+        # pkg:///safe_transform?dependency=1234 -> pkg:///safe_transform
+        definition = _v(child, 'path').split('?')[0]
+    elif kind == INPUT:
+        definition = _uid(_v(child, 'entry'))
+    else:
+        definition = _uid(_v(child, 'output'))
+
+    parameters = child.find('parameters')
+    parameters_xml = None
+    if keep_parameters and parameters is not None and len(parameters):
+        parameters_xml = ElementTree.tostring(parameters)
+
+    position = tuple(
+        float(x) for x in _v(element, 'GUILayout/gpos', '0 0 0').split()
+    )[:2]
+    uid = _uid(_v(element, 'uid'))
+    connections = [
+        Connection(
+            uid,
+            _v(connection, 'identifier'),
+            _uid(_v(connection, 'connRef')),
+            _uid(_v(connection, 'connRefOutput'))
+        )
+        for connection in element.iterfind('connections/connection')
+    ]
+    outputs = tuple(
+        _uid(_v(output, 'uid'))
+        for output in element.iterfind('compOutputs/compOutput')
+    )
+    return Node(uid, kind, definition, position, outputs, parameters_xml), \
+        connections
+
+
+def load(path, parameters=True):
+    """``Package`` of the .sbs at path, see the module docstring"""
+    package = Package(path)
+    graph = None
+    # Only the direct children of these are read, function graphs
+    # nested in parameters have nodes and connections of their own
+    stack = []
+    for event, element in ElementTree.iterparse(
+            str(path), events=('start', 'end')):
+        if event == 'start':
+            stack.append(element.tag)
+            if element.tag == 'graph':
+                graph = Graph('', None)
+            continue
+
+        stack.pop()
+        parent = stack[-1] if stack else None
+        if element.tag == 'compNode' and parent == 'compNodes':
+            node, connections = _node(element, parameters)
+            graph.add_node(node, connections)
+            element.clear()
+        elif element.tag == 'graphoutput':
+            graph.outputs[_uid(_v(element, 'uid'))] = (
+                _v(element, 'identifier'), _v(element, 'attributes/label')
+            )
+            element.clear()
+        elif element.tag == 'dependency':
+            package.dependencies[_uid(_v(element, 'uid'))] = \
+                _v(element, 'filename')
+            element.clear()
+        elif element.tag == 'graph':
+            graph.identifier = _v(element, 'identifier')
+            graph.uid = _uid(_v(element, 'uid'))
+            graph.label = _v(element, 'attributes/label')
+            package.graphs.append(graph)
+            graph = None
+            element.clear()
+        elif parent == 'graph' and element.tag in ('root', 'paraminputs',
+                                                   'baseParameters'):
+            element.clear()
+    return package
+
+
+def iter_packages(paths, parameters=False):
+    """Load one package after the other, for bulk analysis"""
+    for path in paths:
+        yield load(path, parameters)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('sources', nargs='+', help=".sbs files")
+    parser.add_argument('--top', type=int, default=20,
+                        help="Node definitions to list")
+    args = parser.parse_args(argv)
+
+    totals = Counter()
+    graphs = 0
+    for package in iter_packages(args.sources):
+        for graph in package.graphs:
+            graphs += 1
+            totals.update(graph.definitions())
+    print(f"{graphs} graphs in {len(args.sources)} packages")
+    for definition, count in totals.most_common(args.top):
+        print(f"{count:8} {definition}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Physical size of a material from its scan resolution.
+
+The plugins used to divide the output size by 236.22, pixels per cm at
+600 DPI, for every material. The resolution now comes from, in order:
+
+* a sidecar next to the package, ``<package>.scale.json``, holding
+  ``{"dpi": 300}``, ``{"dpi": [300, 600]}`` for non square scans or
+  ``{"physical_size": [21.5, 14.0]}`` in cm
+* the vendor manifest named by ``FABRIC_SCALE_MANIFEST``, a JSON object
+  of material name to the same values, or a CSV with ``material,dpi``
+  and an optional ``dpi_y`` column
+* ``DEFAULT_DPI``
+
+Materials are looked up by package file name, without case. The output
+size is the one most Bitmaps share, Bitmaps of another size are
+reported instead of silently deciding the result.
+"""
+import csv
+import json
+import os
+from collections import Counter, namedtuple
+from pathlib import Path
+
+from sd.api.sdproperty import SDPropertyCategory
+
+
+DEFAULT_DPI = 600
+CM_PER_INCH = 2.54
+SIDECAR_SUFFIX = '.scale.json'
+MANIFEST_ENV = 'FABRIC_SCALE_MANIFEST'
+
+# size is (width, height) in pixels, physical_size (width, height) in cm
+ScaleResult = namedtuple(
+    'ScaleResult', ['size', 'physical_size', 'dpi', 'source', 'mismatched']
+)
+
+
+def _entry(value):
+    """Manifest or sidecar value -> ('dpi' or 'cm', (x, y))"""
+    if isinstance(value, dict):
+        if 'physical_size' in value:
+            width, height = value['physical_size']
+            return 'cm', (float(width), float(height))
+        value = value['dpi']
+    if isinstance(value, (list, tuple)):
+        return 'dpi', (float(value[0]), float(value[1]))
+    return 'dpi', (float(value), float(value))
+
+
+class ScaleTable(object):
+    """Material name -> scan resolution, filled from a vendor manifest"""
+
+    def __init__(self, entries=None):
+        self._entries = {
+            name.lower(): _entry(value)
+            for name, value in (entries or {}).items()
+        }
+        # Sidecar lookups, one file system check per package
+        self._sidecars = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def from_manifest(cls, path):
+        path = Path(path)
+        if path.suffix.lower() == '.csv':
+            entries = {}
+            with open(path, newline='') as f:
+                for row in csv.DictReader(f):
+                    dpi_x = row['dpi']
+                    entries[row['material']] = \
+                        [dpi_x, row.get('dpi_y') or dpi_x]
+            return cls(entries)
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _sidecar(self, package_path):
+        # Unsaved packages have no file path, so no sidecar
+        if not package_path:
+            return None
+        sidecar = Path(package_path).with_suffix(SIDECAR_SUFFIX)
+        if sidecar not in self._sidecars:
+            entry = None
+            if sidecar.exists():
+                with open(sidecar) as f:
+                    entry = _entry(json.load(f))
+            self._sidecars[sidecar] = entry
+        return self._sidecars[sidecar]
+
+    def lookup(self, package_path):
+        """(kind, values, source) for the material saved at package_path"""
+        entry = self._sidecar(package_path)
+        if entry:
+            return entry + ('sidecar',)
+        entry = self._entries.get(Path(package_path).stem.lower())
+        if entry:
+            return entry + ('manifest',)
+        return 'dpi', (DEFAULT_DPI, DEFAULT_DPI), 'default'
+
+
+_tables = {}
+
+
+def default_table():
+    """Table of the manifest in FABRIC_SCALE_MANIFEST, read again on change"""
+    manifest = os.environ.get(MANIFEST_ENV)
+    if not manifest:
+        return ScaleTable()
+    key = (manifest, os.stat(manifest).st_mtime)
+    if key not in _tables:
+        _tables.clear()
+        _tables[key] = ScaleTable.from_manifest(manifest)
+    return _tables[key]
+
+
+def bitmap_sizes(comp_graph):
+    """{Bitmap identifier: (width, height)} in pixels, in one pass"""
+    sizes = {}
+    for node in comp_graph.getNodes():
+        if node.getDefinition().getLabel() == 'Bitmap':
+            # output size is stored as a power of 2, 12 means 4096
+            value = node.getPropertyValueFromId(
+                '$outputsize', SDPropertyCategory.Input
+            ).get()
+            sizes[node.getIdentifier()] = (2 ** value.x, 2 ** value.y)
+    return sizes
+
+
+def resolve(comp_graph, package_path=None, table=None):
+    """Physical size of comp_graph, see ``ScaleResult``
+
+    package_path defaults to the file of the graph's package. Returns
+    None for graphs without Bitmaps.
+    """
+    sizes = bitmap_sizes(comp_graph)
+    if not sizes:
+        return None
+    size = Counter(sizes.values()).most_common(1)[0][0]
+    mismatched = sorted(
+        identifier for identifier, bitmap_size in sizes.items()
+        if bitmap_size != size
+    )
+
+    if package_path is None:
+        package_path = comp_graph.getPackage().getFilePath()
+    kind, values, source = (table or default_table()).lookup(package_path)
+    if kind == 'cm':
+        physical_size = values
+        dpi = tuple(
+            round(pixels / cm * CM_PER_INCH, 2)
+            for pixels, cm in zip(size, values)
+        )
+    else:
+        dpi = values
+        physical_size = tuple(
+            round(pixels / value * CM_PER_INCH, 2)
+            for pixels, value in zip(size, values)
+        )
+    return ScaleResult(size, physical_size, dpi, source, mismatched)
+
+
+def physical_size_property(comp_graph):
+    return comp_graph.getPropertyFromId(
+        'physical_size', SDPropertyCategory.Annotation
+    )
@@ -0,0 +1,116 @@
+"""Interned SD values for constants set over and over.
+
+Setting a property copies the value into the node, so one ``SDValueInt``
+holding 1 can be set on every color_match of a spread instead of
+allocating a new one per node. Only scalar values and types are cached,
+struct and array values are mutable and must stay fresh.
+
+Every factory is an ``lru_cache``: misses are SD allocations, hits are
+allocations saved. ``stats()`` reports both, ``enabled = False`` turns
+the cache off for benchmarking.
+"""
+from functools import lru_cache
+
+from sd.api.sdvaluebool import SDValueBool
+from sd.api.sdvaluefloat import SDValueFloat
+from sd.api.sdvalueint import SDValueInt
+from sd.api.sdvaluestring import SDValueString
+from sd.api.sdtypestruct import SDTypeStruct
+
+
+enabled = True
+
+
+@lru_cache(maxsize=256, typed=True)
+def _int(value):
+    return SDValueInt.sNew(value)
+
+
+@lru_cache(maxsize=4, typed=True)
+def _bool(value):
+    return SDValueBool.sNew(value)
+
+
+@lru_cache(maxsize=256, typed=True)
+def _float(value):
+    return SDValueFloat.sNew(value)
+
+
+# Strings are mostly identifiers, keep enough for a large spread
+@lru_cache(maxsize=2048)
+def _string(value):
+    return SDValueString.sNew(value)
+
+
+@lru_cache(maxsize=64)
+def _type_struct(name):
+    return SDTypeStruct.sNew(name)
+
+
+_FACTORIES = {
+    'int': (_int, SDValueInt.sNew),
+    'bool': (_bool, SDValueBool.sNew),
+    'float': (_float, SDValueFloat.sNew),
+    'string': (_string, SDValueString.sNew),
+    'type_struct': (_type_struct, SDTypeStruct.sNew),
+}
+
+# Allocations made while the cache was disabled
+_uncached = dict.fromkeys(_FACTORIES, 0)
+
+
+def _get(kind, value):
+    cached, factory = _FACTORIES[kind]
+    if enabled:
+        return cached(value)
+    _uncached[kind] += 1
+    return factory(value)
+
+
+def sd_int(value):
+    return _get('int', value)
+
+
+def sd_bool(value):
+    return _get('bool', bool(value))
+
+
+def sd_float(value):
+    return _get('float', float(value))
+
+
+def sd_string(value):
+    return _get('string', value)
+
+
+def sd_type_struct(name):
+    return _get('type_struct', name)
+
+
+def sd_value(value):
+    """Interned SD value for a plain Python bool, int, float or str"""
+    # bool first, it is a subclass of int
+    for kind, factory in ((bool, sd_bool), (int, sd_int),
+                          (float, sd_float), (str, sd_string)):
+        if isinstance(value, kind):
+            return factory(value)
+    raise TypeError(f"No SD value for {type(value).__name__}")
+
+
+def stats():
+    """Allocations made and saved per value kind"""
+    report = {}
+    for kind, (cached, _) in _FACTORIES.items():
+        info = cached.cache_info()
+        report[kind] = {
+            'allocated': info.misses + _uncached[kind],
+            'saved': info.hits,
+            'cached': info.currsize,
+        }
+    return report
+
+
+def clear():
+    for kind, (cached, _) in _FACTORIES.items():
+        cached.cache_clear()
+        _uncached[kind] = 0
@@ -0,0 +1,11 @@
+"""Tests of the pure Python modules, run from the repository root::
+
+    python -m pytest tests
+
+Nothing here needs Designer; modules importing ``sd`` are not tested.
+"""
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
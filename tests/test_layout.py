@@ -0,0 +1,28 @@
+from itertools import combinations
+
+from plugin_common.layout import LayoutPlanner
+
+
+def overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def test_chains_avoid_existing_nodes():
+    existing = [(x * 200, y * 200) for x in range(4) for y in range(-3, 4)]
+    planner = LayoutPlanner(existing)
+    rows = planner.place_chains((0, 0), 30, 3, max_rows=10)
+
+    placed = [pos for row in rows for pos in row]
+    assert len(rows) == 30 and len(placed) == 90
+    boxes = [planner.node_box(*pos) for pos in existing + placed]
+    for a, b in combinations(boxes, 2):
+        assert not overlaps(a, b)
+
+
+def test_batches_avoid_each_other():
+    planner = LayoutPlanner()
+    first = planner.place_nodes((0, 0), 5)
+    second = planner.place_nodes((0, 0), 5)
+    boxes = [planner.node_box(*pos) for pos in first + second]
+    for a, b in combinations(boxes, 2):
+        assert not overlaps(a, b)
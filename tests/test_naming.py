@@ -0,0 +1,61 @@
+import json
+
+from plugin_common import naming
+
+
+def convention(client):
+    return naming.Convention.from_table(naming.load_table(), client)
+
+
+OUTPUTS = [
+    (0, 'basecolor', 'Base Color', ''),
+    (1, 'Normal', '', ''),
+    (2, 'height', 'height', ''),
+    (3, 'albedo', '', ''),
+]
+
+
+def test_plan_default():
+    assert naming.plan(OUTPUTS, convention('default')) == {
+        0: 'BASE', 1: 'NRM', 3: 'BASE_2',
+    }
+
+
+def test_plan_unreal():
+    # height is no alias of a canonical map, it keeps its name
+    assert naming.plan(OUTPUTS, convention('unreal')) == {
+        0: 'BaseColor', 1: 'Normal', 3: 'BaseColor_2',
+    }
+
+
+def test_plan_twice_changes_nothing():
+    unreal = convention('unreal')
+    names = naming.plan(OUTPUTS, unreal)
+    renamed = [
+        (key, names.get(key, identifier), label, definition)
+        for key, identifier, label, definition in OUTPUTS
+    ]
+    current = {key: identifier for key, identifier, _, _ in renamed}
+    again = naming.plan(renamed, unreal)
+    assert all(again[key] == current[key] for key in again)
+
+
+def test_overrides_win():
+    names = naming.plan(OUTPUTS, convention('default'), {1: 'N'})
+    assert names[1] == 'N'
+
+
+def test_variant_names():
+    assert convention('default').variant_name(3) == 'COL_3'
+    assert convention('unreal').variant_name(3, 'fabric_') == \
+        'fabric_BaseColor_03'
+
+
+def test_unknown_client(tmp_path):
+    path = tmp_path.joinpath('naming.json')
+    path.write_text(json.dumps({'aliases': {}, 'clients': {}}))
+    try:
+        naming.Convention.from_table(naming.load_table(path), 'unreal')
+    except naming.NamingError:
+        return
+    raise AssertionError("NamingError not raised")
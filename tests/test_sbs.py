@@ -0,0 +1,50 @@
+from conftest import ROOT
+from plugin_common import sbs
+
+
+NORMAL_TO_HEIGHT = ROOT.joinpath(
+    'alchemist_prep', 'alchemist_prep', 'normal_to_height_hq_cust.sbs'
+)
+
+
+def test_load_graphs():
+    package = sbs.load(NORMAL_TO_HEIGHT)
+    assert [graph.identifier for graph in package.graphs] == [
+        'normal_to_height_hq',
+        'base_algorithm_height_distance',
+        'base_algorithm_height_angle',
+    ]
+    assert 'sbs://auto_levels.sbs' in package.dependencies.values()
+
+
+def test_nodes_and_outputs():
+    graph = sbs.load(NORMAL_TO_HEIGHT).graph('normal_to_height_hq')
+    assert len(graph.nodes) == 23
+    assert list(graph.outputs.values()) == [('height', 'Height')]
+
+    output = graph.output_nodes()['height']
+    assert output.kind == sbs.OUTPUT
+    # The output is fed by a node of the same graph
+    assert len(graph.upstream(output.uid)) == 1
+
+    definitions = graph.definitions()
+    assert definitions['blend'] == 10
+    assert definitions['pkg:///base_algorithm_height_angle'] == 8
+
+
+def test_connections_both_ways():
+    graph = sbs.load(NORMAL_TO_HEIGHT).graph('base_algorithm_height_angle')
+    for connection in graph.connections():
+        assert connection in graph.downstream(connection.source)
+        assert connection in graph.inputs(connection.target)
+
+
+def test_parameters_are_optional():
+    with_parameters = sbs.load(NORMAL_TO_HEIGHT)
+    without = sbs.load(NORMAL_TO_HEIGHT, parameters=False)
+    nodes = with_parameters.graph('normal_to_height_hq').nodes
+    assert any(node.parameters for node in nodes.values())
+    assert not any(
+        node.parameters
+        for node in without.graph('normal_to_height_hq').nodes.values()
+    )
@@ -0,0 +1,55 @@
+import numpy as np
+
+from texture_tools import imagefile
+from texture_tools.palette import load_palette, parse_color
+
+
+def test_parse_color():
+    assert parse_color('#ff0000') == (1.0, 0.0, 0.0)
+    assert parse_color('#f00') == (1.0, 0.0, 0.0)
+    assert parse_color((255, 0, 0)) == (1.0, 0.0, 0.0)
+    assert parse_color((0.5, 0.5, 0.5)) == (0.5, 0.5, 0.5)
+
+
+def test_load_hex_list(tmp_path):
+    path = tmp_path.joinpath('palette.txt')
+    path.write_text("# spring\n#c83a2f\n#fff\n0.5 0.5 0.5\n")
+    palette = load_palette(path)
+    assert [name for name, _ in palette] == ['COL_1', 'COL_2', 'COL_3']
+    assert palette[0][1] == parse_color('#c83a2f')
+    assert palette[2][1] == (0.5, 0.5, 0.5)
+
+
+def test_load_csv_is_0_255(tmp_path):
+    path = tmp_path.joinpath('book.csv')
+    path.write_text("name,r,g,b\ndark,1,1,1\nred,255,0,0\n")
+    assert load_palette(path) == [
+        ('dark', (1 / 255,) * 3), ('red', (1.0, 0.0, 0.0)),
+    ]
+
+
+def test_tga_round_trip(tmp_path):
+    pixels = np.random.default_rng(0).integers(
+        0, 256, (37, 53, 4), dtype=np.uint8
+    )
+    path = tmp_path.joinpath('image.tga')
+    image = imagefile.create_image(path, pixels.shape)
+    image.write(0, 0, pixels)
+    image.flush()
+    del image
+
+    image = imagefile.open_image(path)
+    assert image.shape == pixels.shape
+    assert np.array_equal(image.read(), pixels)
+    assert np.array_equal(image.read(10, 20, 5, 15), pixels[10:20, 5:15])
+
+
+def test_npy_round_trip(tmp_path):
+    pixels = np.random.default_rng(1).random((16, 8, 3), dtype=np.float32)
+    path = tmp_path.joinpath('image.npy')
+    image = imagefile.create_image(path, pixels.shape, np.float32)
+    image.write(0, 0, pixels)
+    image.flush()
+    del image
+
+    assert np.array_equal(imagefile.open_image(path).read(), pixels)
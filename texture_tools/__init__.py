@@ -0,0 +1,7 @@
+"""Offline texture tools, runnable without Substance Designer.
+
+These work on exported image files with NumPy and are meant for batch
+jobs on the farm, e.g. ``python -m texture_tools.atlas``. Images are
+opened as memory mapped arrays where the format allows it, so large maps
+are only paged in where they are actually read.
+"""
@@ -0,0 +1,84 @@
+"""Slice a palette atlas exported by color_mixer into per color files.
+
+The atlas comes with a JSON sidecar (same name, ``.json``) holding the
+grid written by the plugin::
+
+    {"columns": 4, "rows": 3, "count": 10, "palette": [[r, g, b, a], ...]}
+
+Usage::
+
+    python -m texture_tools.atlas COL_ATLAS.tga -o variants/
+"""
+import argparse
+import json
+from pathlib import Path
+
+from texture_tools.imagefile import open_image, save_image
+
+
+def load_layout(atlas_path, layout_path=None):
+    layout_path = Path(layout_path or Path(atlas_path).with_suffix('.json'))
+    with open(layout_path) as f:
+        return json.load(f)
+
+
+def cell_bounds(index, columns, rows, width, height):
+    """Pixel bounds (top, bottom, left, right) of cell index"""
+    column = index % columns
+    row = index // columns
+    return (
+        row * height // rows,
+        (row + 1) * height // rows,
+        column * width // columns,
+        (column + 1) * width // columns,
+    )
+
+
+def slice_atlas(atlas_path, out_dir, layout=None, prefix='COL',
+                file_format=None):
+    """Write every atlas cell to out_dir as ``<prefix>_<n>``
+
+    Only the rows of the cell being written are read from the mapped
+    atlas. Returns the written paths.
+    """
+    atlas_path = Path(atlas_path)
+    layout = layout or load_layout(atlas_path)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    suffix = file_format or atlas_path.suffix.lstrip('.')
+
+    atlas = open_image(atlas_path)
+    height, width = atlas.shape[:2]
+    columns, rows = layout['columns'], layout['rows']
+
+    written = []
+    for i in range(layout['count']):
+        top, bottom, left, right = cell_bounds(i, columns, rows, width, height)
+        cell = atlas.read(top, bottom, left, right)
+        written.append(
+            save_image(out_dir.joinpath(f"{prefix}_{i + 1}.{suffix}"), cell)
+        )
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('atlas', help="Atlas image (.tga or .npy)")
+    parser.add_argument('-o', '--out', default='.', help="Output folder")
+    parser.add_argument('--layout', help="Layout JSON, defaults to sidecar")
+    parser.add_argument('--prefix', default='COL')
+    parser.add_argument('--format', help="Output format, tga or npy")
+    args = parser.parse_args(argv)
+
+    written = slice_atlas(
+        args.atlas,
+        args.out,
+        load_layout(args.atlas, args.layout),
+        args.prefix,
+        args.format
+    )
+    print(f"Wrote {len(written)} variants to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
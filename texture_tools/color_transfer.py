@@ -0,0 +1,101 @@
+"""Approximate color_match transfer in CIE Lab.
+
+The color_match node recolors a map so its average color lands on the
+target while keeping the detail of the source. The approximation used
+here shifts the Lab mean of the image onto the target color and, when a
+target spread is given, rescales the deviation around it. Images are
+float arrays in ``[0, 1]`` with sRGB encoded RGB in the last axis.
+"""
+import numpy as np
+
+
+# sRGB primaries, D65 white
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+_XYZ_TO_RGB = np.linalg.inv(_RGB_TO_XYZ)
+_WHITE = np.array([0.95047, 1.0, 1.08883])
+
+_EPSILON = 216 / 24389
+_KAPPA = 24389 / 27
+
+
+def srgb_to_linear(rgb):
+    return np.where(
+        rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4
+    )
+
+
+def linear_to_srgb(rgb):
+    rgb = np.clip(rgb, 0, 1)
+    return np.where(
+        rgb <= 0.0031308, rgb * 12.92, 1.055 * rgb ** (1 / 2.4) - 0.055
+    )
+
+
+def rgb_to_lab(rgb):
+    """sRGB ``(..., 3)`` -> Lab ``(..., 3)``"""
+    xyz = srgb_to_linear(np.asarray(rgb, dtype=np.float32)) @ _RGB_TO_XYZ.T
+    xyz /= _WHITE
+    f = np.where(
+        xyz > _EPSILON, np.cbrt(xyz), (_KAPPA * xyz + 16) / 116
+    )
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1).astype(np.float32)
+
+
+def lab_to_rgb(lab):
+    """Lab ``(..., 3)`` -> sRGB ``(..., 3)`` clipped to [0, 1]"""
+    lab = np.asarray(lab, dtype=np.float32)
+    fy = (lab[..., 0] + 16) / 116
+    fx = fy + lab[..., 1] / 500
+    fz = fy - lab[..., 2] / 200
+    f = np.stack([fx, fy, fz], axis=-1)
+    f3 = f ** 3
+    xyz = np.where(f3 > _EPSILON, f3, (116 * f - 16) / _KAPPA)
+    rgb = (xyz * _WHITE) @ _XYZ_TO_RGB.T
+    return linear_to_srgb(rgb).astype(np.float32)
+
+
+def lab_stats(lab):
+    """Per channel mean and standard deviation of a Lab image"""
+    flat = lab.reshape(-1, 3)
+    return flat.mean(axis=0), flat.std(axis=0)
+
+
+def transfer_lab(lab, source_stats, target_lab, target_std=None):
+    """Move Lab pixels from the source statistics onto the target
+
+    Without target_std the source deviation is kept, which matches a
+    uniform target color the way color_match does.
+    """
+    mean, std = source_stats
+    if target_std is None:
+        return lab - mean + target_lab
+    scale = np.asarray(target_std) / np.maximum(std, 1e-6)
+    return (lab - mean) * scale + target_lab
+
+
+def transfer(rgb, target_rgb, target_std=None, stats=None):
+    """Recolor an sRGB image so its mean color becomes target_rgb
+
+    Alpha, if present, is passed through. stats lets callers reuse the
+    source Lab statistics, e.g. when processing an image in tiles.
+    """
+    rgb = np.asarray(rgb, dtype=np.float32)
+    color = rgb[..., :3]
+    lab = rgb_to_lab(color)
+    if stats is None:
+        stats = lab_stats(lab)
+
+    target_lab = rgb_to_lab(np.asarray(target_rgb[:3], dtype=np.float32))
+    result = lab_to_rgb(transfer_lab(lab, stats, target_lab, target_std))
+
+    if rgb.shape[-1] > 3:
+        result = np.concatenate([result, rgb[..., 3:]], axis=-1)
+    return result
@@ -0,0 +1,197 @@
+"""Memory mapped image files.
+
+Only formats whose pixels sit uncompressed at a fixed offset can be
+memory mapped, which covers NumPy ``.npy`` files and uncompressed TGA
+(the format Designer writes by default). Regions are read and written as
+``(height, width, channels)`` arrays with the first row at the top of the
+image and RGB(A) channel order, whatever the file stores.
+
+PNG, JPEG, TIFF and BMP are read too when Pillow is installed, decoded
+whole into memory since they can't be mapped. They can't be written.
+"""
+import struct
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+TGA_HEADER = struct.Struct('<BBBHHBHHHHBB')
+
+# TGA image types we can map directly
+TGA_TRUECOLOR = 2
+TGA_GRAYSCALE = 3
+
+# Image descriptor bit set when rows are stored top to bottom
+TGA_TOP_LEFT = 0x20
+
+MAPPED_SUFFIXES = ('.npy', '.tga')
+DECODED_SUFFIXES = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+
+# Pillow modes kept as they are, others are converted to RGBA
+DECODED_MODES = ('L', 'RGB', 'RGBA', 'I;16')
+
+
+class ImageFormatError(ValueError):
+    pass
+
+
+class MappedImage(object):
+    """Memory mapped pixels plus how the file orders them"""
+    __slots__ = ('pixels', 'bgr')
+
+    def __init__(self, pixels, bgr=False):
+        # pixels is a view with rows already top to bottom
+        self.pixels = pixels
+        self.bgr = bgr and pixels.shape[2] >= 3
+
+    @property
+    def shape(self):
+        return self.pixels.shape
+
+    @property
+    def dtype(self):
+        return self.pixels.dtype
+
+    def _swap(self, region):
+        if self.bgr:
+            region = region.copy()
+            region[..., [0, 2]] = region[..., [2, 0]]
+        return region
+
+    def read(self, top=0, bottom=None, left=0, right=None):
+        """Copy a region in RGB(A) order, only that region is paged in"""
+        region = np.array(self.pixels[top:bottom, left:right])
+        return self._swap(region)
+
+    def write(self, top, left, region):
+        """Write an RGB(A) region with its top left corner at (top, left)"""
+        if region.ndim == 2:
+            region = region[..., np.newaxis]
+        height, width = region.shape[:2]
+        self.pixels[top:top + height, left:left + width] = \
+            self._swap(region)
+
+    def flush(self):
+        if hasattr(self.pixels, 'flush'):
+            self.pixels.flush()
+
+
+def open_image(path, mode='r'):
+    """Memory map the image at path, PNG and the like are decoded instead"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == '.npy':
+        pixels = np.load(path, mmap_mode=mode)
+        if pixels.ndim == 2:
+            pixels = pixels[..., np.newaxis]
+        return MappedImage(pixels)
+    if suffix == '.tga':
+        return _open_tga(path, mode)
+    if suffix in DECODED_SUFFIXES and mode == 'r':
+        return MappedImage(_decode(path))
+    raise ImageFormatError(f"Can't memory map {path.name}, use .tga or .npy")
+
+
+def _decode(path):
+    if Image is None:
+        raise ImageFormatError(
+            f"Reading {path.name} needs Pillow, or convert it to .tga"
+        )
+    with Image.open(path) as image:
+        if image.mode not in DECODED_MODES:
+            image = image.convert('RGBA' if 'A' in image.getbands() or
+                                  'transparency' in image.info else 'RGB')
+        pixels = np.asarray(image)
+    if pixels.dtype != np.uint8:
+        pixels = pixels.astype(np.uint16)
+    if pixels.ndim == 2:
+        pixels = pixels[..., np.newaxis]
+    return pixels
+
+
+def _open_tga(path, mode):
+    with open(path, 'rb') as f:
+        header = TGA_HEADER.unpack(f.read(TGA_HEADER.size))
+
+    (id_length, color_map_type, image_type, _, color_map_length,
+     color_map_depth, _, _, width, height, depth, descriptor) = header
+
+    if image_type not in (TGA_TRUECOLOR, TGA_GRAYSCALE) or color_map_type:
+        raise ImageFormatError(
+            f"{path.name} is compressed or color mapped (type {image_type})"
+        )
+    if depth not in (8, 24, 32):
+        raise ImageFormatError(f"{path.name} has unsupported depth {depth}")
+
+    channels = depth // 8
+    offset = TGA_HEADER.size + id_length + \
+        color_map_length * ((color_map_depth + 7) // 8)
+
+    pixels = np.memmap(
+        path, dtype=np.uint8, mode=mode, offset=offset,
+        shape=(height, width, channels)
+    )
+    if not descriptor & TGA_TOP_LEFT:
+        pixels = pixels[::-1]
+    return MappedImage(pixels, bgr=True)
+
+
+def create_image(path, shape, dtype=np.uint8):
+    """Create a writable memory mapped image, the format follows path"""
+    path = Path(path)
+    height, width, channels = shape
+    suffix = path.suffix.lower()
+
+    if suffix == '.npy':
+        return MappedImage(np.lib.format.open_memmap(
+            path, mode='w+', dtype=dtype, shape=shape
+        ))
+    if suffix != '.tga':
+        raise ImageFormatError(f"Can't write {path.name}, use .tga or .npy")
+    if np.dtype(dtype) != np.uint8 or channels not in (1, 3, 4):
+        raise ImageFormatError("TGA files hold 1, 3 or 4 uint8 channels")
+
+    image_type = TGA_GRAYSCALE if channels == 1 else TGA_TRUECOLOR
+    alpha_bits = 8 if channels == 4 else 0
+    with open(path, 'wb') as f:
+        f.write(TGA_HEADER.pack(
+            0, 0, image_type, 0, 0, 0, 0, 0, width, height,
+            channels * 8, TGA_TOP_LEFT | alpha_bits
+        ))
+        f.truncate(TGA_HEADER.size + height * width * channels)
+    return _open_tga(path, 'r+')
+
+
+def to_float(pixels):
+    """Image region -> float32 in [0, 1]"""
+    if np.issubdtype(pixels.dtype, np.integer):
+        return pixels.astype(np.float32) / np.iinfo(pixels.dtype).max
+    return pixels.astype(np.float32)
+
+
+def from_float(pixels, dtype):
+    """float pixels in [0, 1] -> dtype"""
+    if np.issubdtype(dtype, np.integer):
+        return (pixels * np.iinfo(dtype).max + 0.5).astype(dtype)
+    return pixels.astype(dtype)
+
+
+def row_tiles(height, tile_rows):
+    """(top, bottom) of every tile_rows high band"""
+    for top in range(0, height, tile_rows):
+        yield top, min(top + tile_rows, height)
+
+
+def save_image(path, array):
+    """Write a whole RGB(A) array to path, return the path"""
+    if array.ndim == 2:
+        array = array[..., np.newaxis]
+    image = create_image(path, array.shape, array.dtype)
+    image.write(0, 0, array)
+    image.flush()
+    return Path(path)
@@ -0,0 +1,274 @@
+"""Height maps from tangent space normal maps, without Designer.
+
+Integrates the slopes of a normal map with the Frankot-Chellappa FFT
+Poisson solver. Used to pre-bake displacement on the farm and as a
+reference for the DISP output alchemist_prep builds with
+normal_to_height (height_normalize on, so results are compared 0-1).
+
+Maps larger than one tile are integrated in two passes to bound the
+FFT size and memory:
+
+1. the slopes, averaged down to at most one tile, are integrated at once
+   for the low frequencies of the whole map
+2. every tile, with a margin, is integrated alone and only its detail
+   above the coarse scale is added back
+
+Textures are assumed to tile, the coarse pass wraps around the edges.
+
+Usage::
+
+    python -m texture_tools.normal_height fabric-NRM.tga -o heights/
+    python -m texture_tools.normal_height exports/ -o heights/ -j 8
+    python -m texture_tools.normal_height fabric-NRM.tga --compare DISP.tga
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, log2
+from pathlib import Path
+
+import numpy as np
+
+from texture_tools.imagefile import create_image, open_image, to_float, \
+    from_float, row_tiles
+
+
+DEFAULT_TILE = 1024
+DEFAULT_MARGIN = 64
+
+# Flattest normal z used, keeps grazing normals from exploding the slope
+MIN_NORMAL_Z = 1e-3
+
+NORMAL_PATTERNS = ('*NRM*', '*Normal*', '*normal*')
+
+
+def slopes(rgb, directx=False):
+    """Height slopes (along x, down the rows) of normal map pixels in 0-1"""
+    normal = rgb[..., :3] * 2 - 1
+    nz = np.maximum(normal[..., 2], MIN_NORMAL_Z)
+    dx = -normal[..., 0] / nz
+    # OpenGL green points up the image, rows go down
+    dy = normal[..., 1] / nz
+    if directx:
+        dy = -dy
+    return dx.astype(np.float32), dy.astype(np.float32)
+
+
+def integrate(dx, dy):
+    """Frankot-Chellappa, periodic height with zero mean"""
+    height, width = dx.shape
+    wx = 2 * np.pi * np.fft.fftfreq(width)[np.newaxis, :]
+    wy = 2 * np.pi * np.fft.fftfreq(height)[:, np.newaxis]
+    denominator = wx ** 2 + wy ** 2
+    denominator[0, 0] = 1
+
+    spectrum = (-1j * wx * np.fft.fft2(dx) - 1j * wy * np.fft.fft2(dy)) \
+        / denominator
+    spectrum[0, 0] = 0
+    return np.real(np.fft.ifft2(spectrum)).astype(np.float32)
+
+
+def integrate_mirrored(dx, dy):
+    """Frankot-Chellappa for a region that does not tile
+
+    The slopes are mirrored into a 2x2 periodic block first, which keeps
+    the solver from wrapping one edge into the other.
+    """
+    flip_x = dx[:, ::-1]
+    flip_y = dy[::-1]
+    ext_dx = np.block([[dx, -flip_x], [dx[::-1], -flip_x[::-1]]])
+    ext_dy = np.block([[dy, dy[:, ::-1]], [-flip_y, -flip_y[:, ::-1]]])
+    height, width = dx.shape
+    return integrate(ext_dx, ext_dy)[:height, :width]
+
+
+def _block_mean(array, factor):
+    height, width = array.shape
+    return array.reshape(
+        height // factor, factor, width // factor, factor
+    ).mean(axis=(1, 3))
+
+
+def _upsample(array, factor):
+    """Bilinear, wrapping around the edges"""
+    for axis in (0, 1):
+        size = array.shape[axis] * factor
+        coords = (np.arange(size) + 0.5) / factor - 0.5
+        low = np.floor(coords).astype(np.int64)
+        frac = (coords - low).astype(np.float32)
+        count = array.shape[axis]
+        a = np.take(array, low % count, axis=axis)
+        b = np.take(array, (low + 1) % count, axis=axis)
+        shape = [1, 1]
+        shape[axis] = size
+        frac = frac.reshape(shape)
+        array = a + (b - a) * frac
+    return array
+
+
+def integrate_tiled(dx, dy, tile=DEFAULT_TILE, margin=DEFAULT_MARGIN):
+    """Height of a tiling normal map, see the module docstring"""
+    height, width = dx.shape
+    if max(height, width) <= tile:
+        return integrate(dx, dy)
+
+    factor = 2 ** int(ceil(log2(max(height, width) / tile)))
+    if height % factor or width % factor or tile % factor:
+        raise ValueError(
+            f"{width}x{height} does not split into {tile} tiles"
+        )
+    # Keep the margin on the coarse grid so block means line up
+    margin = int(ceil(margin / factor)) * factor
+
+    # Slopes are per pixel, a coarse pixel spans factor pixels
+    result = _upsample(integrate(
+        _block_mean(dx, factor) * factor, _block_mean(dy, factor) * factor
+    ), factor)
+
+    for top, bottom in row_tiles(height, tile):
+        rows = np.arange(top - margin, bottom + margin) % height
+        for left, right in row_tiles(width, tile):
+            cols = np.arange(left - margin, right + margin) % width
+            window = np.ix_(rows, cols)
+            local = integrate_mirrored(dx[window], dy[window])
+            detail = local - _upsample(_block_mean(local, factor), factor)
+            result[top:bottom, left:right] += detail[
+                margin:margin + bottom - top, margin:margin + right - left
+            ]
+    return result
+
+
+def read_slopes(path, directx=False, tile_rows=DEFAULT_TILE):
+    """Slopes of a normal map file, read in row tiles"""
+    image = open_image(path)
+    height, width = image.shape[:2]
+    dx = np.empty((height, width), np.float32)
+    dy = np.empty((height, width), np.float32)
+    for top, bottom in row_tiles(height, tile_rows):
+        dx[top:bottom], dy[top:bottom] = slopes(
+            to_float(image.read(top, bottom)), directx
+        )
+    return dx, dy
+
+
+def normalize_height(height):
+    """Stretch to 0-1 like normal_to_height's height_normalize"""
+    low, high = height.min(), height.max()
+    if high - low < 1e-12:
+        return np.zeros_like(height)
+    return (height - low) / (high - low)
+
+
+def normal_to_height(source, target, directx=False, tile=DEFAULT_TILE,
+                     margin=DEFAULT_MARGIN):
+    """Write the normalized height of source to target, return target
+
+    .tga targets are 8 bit, .npy targets keep float32.
+    """
+    height = normalize_height(
+        integrate_tiled(*read_slopes(source, directx), tile, margin)
+    )
+    target = Path(target)
+    dtype = np.float32 if target.suffix.lower() == '.npy' else np.uint8
+    output = create_image(target, height.shape + (1,), dtype)
+    for top, bottom in row_tiles(height.shape[0], tile):
+        output.write(top, 0, from_float(
+            height[top:bottom, :, np.newaxis], np.dtype(dtype)
+        ))
+    output.flush()
+    return target
+
+
+def compare(height_path, reference_path):
+    """RMS and max difference of two height files, both normalized 0-1"""
+    heights = []
+    for path in (height_path, reference_path):
+        image = open_image(path)
+        pixels = to_float(image.read(0, image.shape[0]))
+        heights.append(normalize_height(pixels[..., 0]))
+    if heights[0].shape != heights[1].shape:
+        raise ValueError(
+            f"Sizes differ: {heights[0].shape} and {heights[1].shape}"
+        )
+    difference = heights[0] - heights[1]
+    return float(np.sqrt(np.mean(difference ** 2))), \
+        float(np.abs(difference).max())
+
+
+def _job(args):
+    return normal_to_height(*args)
+
+
+def find_normal_maps(paths):
+    """Expand folders into the normal maps they hold"""
+    found = []
+    for path in map(Path, paths):
+        if not path.is_dir():
+            found.append(path)
+            continue
+        matches = set()
+        for pattern in NORMAL_PATTERNS:
+            matches.update(
+                p for p in path.glob(pattern)
+                if p.suffix.lower() in ('.tga', '.npy')
+            )
+        found.extend(sorted(matches))
+    return found
+
+
+def convert(sources, out_dir, workers=None, directx=False,
+            tile=DEFAULT_TILE, margin=DEFAULT_MARGIN, file_format=None):
+    """Integrate every normal map across a process pool
+
+    Files are named ``<source stem>_height``. Returns the written paths.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [
+        (
+            source,
+            out_dir.joinpath(
+                f"{source.stem}_height."
+                f"{file_format or source.suffix.lstrip('.')}"
+            ),
+            directx,
+            tile,
+            margin,
+        )
+        for source in find_normal_maps(sources)
+    ]
+
+    if workers == 1 or len(jobs) < 2:
+        return [_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_job, jobs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('sources', nargs='+',
+                        help="Normal maps (.tga or .npy) or folders")
+    parser.add_argument('-o', '--out', default='.', help="Output folder")
+    parser.add_argument('-j', '--workers', type=int, help="Processes")
+    parser.add_argument('--directx', action='store_true',
+                        help="Green channel points down")
+    parser.add_argument('--tile', type=int, default=DEFAULT_TILE)
+    parser.add_argument('--margin', type=int, default=DEFAULT_MARGIN)
+    parser.add_argument('--format', help="Output format, tga or npy")
+    parser.add_argument('--compare', metavar='HEIGHT',
+                        help="Height exported by Designer to check against")
+    args = parser.parse_args(argv)
+
+    written = convert(
+        args.sources, args.out, args.workers, args.directx, args.tile,
+        args.margin, args.format
+    )
+    print(f"Wrote {len(written)} height maps to {args.out}")
+
+    if args.compare:
+        for path in written:
+            rms, worst = compare(path, args.compare)
+            print(f"{path.name}: rms {rms:.4f}, max {worst:.4f}")
+
+
+if __name__ == '__main__':
+    main()
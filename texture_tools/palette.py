@@ -0,0 +1,93 @@
+"""Palettes in the formats color_mixer works with.
+
+A palette is a list of ``(name, (r, g, b))`` pairs with floats in
+``[0, 1]``. Sources are:
+
+* a hue spread, the same colors color_mixer generates
+* a custom list, one color per line or a JSON list, as hex (``#c83a2f``,
+  ``#c83``), 0-255 integers or 0-1 floats. Other lines starting with
+  ``#`` are comments
+* a Pantone book export, CSV with ``name,r,g,b`` columns (0-255)
+
+Pure Python so the plugin can share it without NumPy.
+"""
+from colorsys import hsv_to_rgb
+import csv
+import json
+from pathlib import Path
+import re
+
+
+# Saturation and value of the generated hue spread
+SPREAD_SATURATION = .25
+SPREAD_VALUE = .75
+
+# A '#' line is a comment unless it is a color
+HEX_COLOR = re.compile(r'#?([0-9a-fA-F]{3}|[0-9a-fA-F]{6})')
+
+
+def hue_spread(count, saturation=SPREAD_SATURATION, value=SPREAD_VALUE):
+    """count colors evenly spaced around the hue wheel"""
+    palette = []
+    for i in range(count):
+        rgb = hsv_to_rgb(i / count, saturation, value)
+        palette.append((f"COL_{i + 1}", rgb))
+    return palette
+
+
+def parse_color(value):
+    """Hex string or sequence of 0-255 / 0-1 numbers -> (r, g, b) floats"""
+    if isinstance(value, str):
+        match = HEX_COLOR.fullmatch(value.strip())
+        if not match:
+            raise ValueError(f"Bad hex color: {value}")
+        digits = match.group(1)
+        if len(digits) == 3:
+            digits = ''.join(c * 2 for c in digits)
+        return tuple(int(digits[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+    rgb = [float(c) for c in value[:3]]
+    if any(c > 1 for c in rgb):
+        rgb = [c / 255 for c in rgb]
+    return tuple(rgb)
+
+
+def _is_comment(line):
+    line = line.strip()
+    return line.startswith('#') and not HEX_COLOR.fullmatch(line)
+
+
+def load_palette(path):
+    """Read a custom list (.json / .txt) or a Pantone book export (.csv)"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == '.csv':
+        with open(path, newline='') as f:
+            # Always 0-255, a dark 1,1,1 is not white
+            return [
+                (row['name'],
+                 tuple(float(row[c]) / 255 for c in ('r', 'g', 'b')))
+                for row in csv.DictReader(f)
+            ]
+
+    if suffix == '.json':
+        with open(path) as f:
+            entries = json.load(f)
+    else:
+        with open(path) as f:
+            entries = [
+                line.split() if ' ' in line.strip() else line
+                for line in f if line.strip() and not _is_comment(line)
+            ]
+
+    palette = []
+    for i, entry in enumerate(entries):
+        if isinstance(entry, dict):
+            palette.append((
+                entry.get('name', f"COL_{i + 1}"),
+                parse_color(entry['color'])
+            ))
+        else:
+            palette.append((f"COL_{i + 1}", parse_color(entry)))
+    return palette
@@ -0,0 +1,169 @@
+"""Batch recoloring of color maps, color_mixer without Designer.
+
+Applies the Lab transfer from ``texture_tools.color_transfer`` to image
+files for every color of a palette. The source is memory mapped and
+processed in row tiles, so an 8K map is never fully loaded:
+
+1. one pass over the tiles gathers the Lab mean and deviation
+2. every target color is written by a worker of a process pool, tile by
+   tile into a memory mapped output file
+
+Sources are uncompressed TGA or .npy. PNG, JPEG and TIFF maps need
+Pillow, they are decoded once into a temporary .npy and written as TGA
+unless ``--format`` says otherwise.
+
+Usage::
+
+    python -m texture_tools.recolor fabric_COL.tga --spread 6 -o out/
+    python -m texture_tools.recolor fabric_COL.png --palette tcx.csv -j 8
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import tempfile
+
+import numpy as np
+
+from texture_tools.color_transfer import rgb_to_lab, lab_to_rgb, \
+    transfer_lab
+from texture_tools.imagefile import MAPPED_SUFFIXES, open_image, \
+    create_image, to_float, from_float, row_tiles
+from texture_tools.palette import hue_spread, load_palette
+
+
+# Rows per tile, 512 rows of an 8K RGBA float image is about 64MB
+DEFAULT_TILE_ROWS = 512
+
+
+def image_stats(path, tile_rows=DEFAULT_TILE_ROWS):
+    """Lab mean and deviation of an image, accumulated tile by tile"""
+    image = open_image(path)
+    total = np.zeros(3, dtype=np.float64)
+    total_sq = np.zeros(3, dtype=np.float64)
+    count = 0
+
+    for top, bottom in row_tiles(image.shape[0], tile_rows):
+        lab = rgb_to_lab(to_float(image.read(top, bottom))[..., :3])
+        flat = lab.reshape(-1, 3).astype(np.float64)
+        total += flat.sum(axis=0)
+        total_sq += (flat ** 2).sum(axis=0)
+        count += flat.shape[0]
+
+    mean = total / count
+    std = np.sqrt(np.maximum(total_sq / count - mean ** 2, 0))
+    return mean.astype(np.float32), std.astype(np.float32)
+
+
+def recolor_file(source, target, rgb, stats=None,
+                 tile_rows=DEFAULT_TILE_ROWS):
+    """Write source recolored to rgb into target, return target"""
+    stats = stats or image_stats(source, tile_rows)
+    image = open_image(source)
+    output = create_image(target, image.shape, image.dtype)
+    target_lab = rgb_to_lab(np.asarray(rgb, dtype=np.float32))
+
+    for top, bottom in row_tiles(image.shape[0], tile_rows):
+        pixels = to_float(image.read(top, bottom))
+        result = lab_to_rgb(
+            transfer_lab(rgb_to_lab(pixels[..., :3]), stats, target_lab)
+        )
+        if pixels.shape[-1] > 3:
+            result = np.concatenate([result, pixels[..., 3:]], axis=-1)
+        output.write(top, 0, from_float(result, image.dtype))
+
+    output.flush()
+    return Path(target)
+
+
+def _recolor_job(args):
+    return recolor_file(*args)
+
+
+def _mapped_copy(source, directory):
+    """.npy copy of a source that can't be memory mapped, decoded once"""
+    image = open_image(source)
+    copy_path = Path(directory, f"{source.stem}.npy")
+    copy = create_image(copy_path, image.shape, image.dtype)
+    copy.write(0, 0, image.read())
+    copy.flush()
+    return copy_path, image.dtype
+
+
+def recolor_palette(source, palette, out_dir, workers=None,
+                    tile_rows=DEFAULT_TILE_ROWS, file_format=None):
+    """Recolor source once per palette entry across a process pool
+
+    Files are named ``<source stem>_<color name>``. Returns the written
+    paths in palette order.
+    """
+    source = Path(source)
+    if source.suffix.lower() in MAPPED_SUFFIXES:
+        return _recolor_palette(source, source, palette, out_dir, workers,
+                                tile_rows, file_format)
+
+    # Workers would each decode a PNG again, they map a copy instead
+    with tempfile.TemporaryDirectory() as directory:
+        mapped, dtype = _mapped_copy(source, directory)
+        default_format = 'tga' if dtype == np.uint8 else 'npy'
+        return _recolor_palette(source, mapped, palette, out_dir, workers,
+                                tile_rows, file_format or default_format)
+
+
+def _recolor_palette(source, mapped, palette, out_dir, workers, tile_rows,
+                     file_format):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    suffix = file_format or source.suffix.lstrip('.')
+
+    stats = image_stats(mapped, tile_rows)
+    jobs = [
+        (
+            mapped,
+            out_dir.joinpath(f"{source.stem}_{_safe_name(name)}.{suffix}"),
+            rgb,
+            stats,
+            tile_rows,
+        )
+        for name, rgb in palette
+    ]
+
+    if workers == 1 or len(jobs) < 2:
+        return [_recolor_job(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_recolor_job, jobs))
+
+
+def _safe_name(name):
+    return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('source',
+                        help="Color map (.tga or .npy, .png, .jpg or "
+                             ".tif with Pillow)")
+    colors = parser.add_mutually_exclusive_group(required=True)
+    colors.add_argument('--spread', type=int, help="Number of hue colors")
+    colors.add_argument('--palette', help="Custom list or Pantone CSV")
+    parser.add_argument('-o', '--out', default='.', help="Output folder")
+    parser.add_argument('-j', '--workers', type=int, help="Processes")
+    parser.add_argument('--tile-rows', type=int, default=DEFAULT_TILE_ROWS)
+    parser.add_argument('--format',
+                        help="Output format, tga or npy, the source's by "
+                             "default, tga for compressed sources")
+    args = parser.parse_args(argv)
+
+    if args.spread:
+        palette = hue_spread(args.spread)
+    else:
+        palette = load_palette(args.palette)
+
+    written = recolor_palette(
+        args.source, palette, args.out, args.workers, args.tile_rows,
+        args.format
+    )
+    print(f"Wrote {len(written)} variants to {args.out}")
+
+
+if __name__ == '__main__':
+    main()